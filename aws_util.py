@@ -1,17 +1,41 @@
+import atexit
+import functools
 import logging
+import threading
+import uuid
 import boto3
-from botocore.exceptions import NoCredentialsError, ClientError
+from botocore.exceptions import BotoCoreError, NoCredentialsError, ClientError
 import json
 from datetime import datetime
 
+# AWS clients are created on first use, importing this module makes no AWS calls
+@functools.lru_cache(maxsize=None)
+def get_cloudwatch_logs_client():
+    return boto3.client('logs', region_name='ap-southeast-2')
+
+@functools.lru_cache(maxsize=None)
+def get_s3_client():
+    return boto3.client('s3')
+
+@functools.lru_cache(maxsize=None)
+def get_cloudwatch_client():
+    return boto3.client('cloudwatch', region_name='ap-southeast-2')
+
 # CloudWatch log configuration
-cloudwatch_logs_client = boto3.client('logs', region_name='ap-southeast-2')
 log_group_name = "zoho_migration"
 log_stream_name = "zoho_crm_mig_2024"
 
+# PutLogEvents limits and the writer's flush interval
+max_batch_events = 10000
+max_batch_bytes = 1048576
+max_event_bytes = 262144
+event_overhead_bytes = 26
+max_batch_span_ms = 24 * 60 * 60 * 1000
+flush_interval_seconds = 5
+
 # S3 bucket for long-term log storage
-s3_client = boto3.client('s3')
 s3_bucket_name = "zoho-mig-mgdb-cf-log"
+error_log_flush_bytes = 1024 * 1024  # Buffered error entries written to S3 once they reach this size
 
 def setup_logging():
     logging.basicConfig(level=logging.INFO)
@@ -20,70 +44,210 @@ def setup_logging():
 
 def initialize_cloudwatch_log_group_and_stream():
     try:
-        cloudwatch_logs_client.create_log_group(logGroupName=log_group_name)
+        get_cloudwatch_logs_client().create_log_group(logGroupName=log_group_name)
         print(f"Log group '{log_group_name}' created successfully.")
-    except cloudwatch_logs_client.exceptions.ResourceAlreadyExistsException:
+    except get_cloudwatch_logs_client().exceptions.ResourceAlreadyExistsException:
         print(f"Log group '{log_group_name}' already exists.")
 
-    existing_streams = cloudwatch_logs_client.describe_log_streams(
+    existing_streams = get_cloudwatch_logs_client().describe_log_streams(
         logGroupName=log_group_name,
         logStreamNamePrefix=log_stream_name
     )['logStreams']
     
     if not existing_streams:
-        cloudwatch_logs_client.create_log_stream(logGroupName=log_group_name, logStreamName=log_stream_name)
+        get_cloudwatch_logs_client().create_log_stream(logGroupName=log_group_name, logStreamName=log_stream_name)
         print(f"Log stream '{log_stream_name}' created successfully in log group '{log_group_name}'.")
     else:
         print(f"Log stream '{log_stream_name}' already exists in log group '{log_group_name}'.")
 
-def log_to_cloudwatch(message):
-    try:
-        response = cloudwatch_logs_client.describe_log_streams(
-            logGroupName=log_group_name,
-            logStreamNamePrefix=log_stream_name
-        )
-        log_streams = response['logStreams']
-        if not log_streams:
-            print(f"No log streams found in log group '{log_group_name}' for '{log_stream_name}'")
+class CloudWatchLogsWriter:
+    """
+    Buffers log events and sends them to one CloudWatch Logs stream in batches.
+
+    The stream is resolved (and created if missing) once, and the sequence
+    token returned by each PutLogEvents call is cached for the next one.
+    Events are flushed by a background thread every `flush_interval`
+    seconds, or sooner when a full batch is waiting, so callers never block
+    on the API.
+    """
+
+    def __init__(self, group_name=log_group_name, stream_name=log_stream_name, flush_interval=flush_interval_seconds):
+        self.group_name = group_name
+        self.stream_name = stream_name
+        self.flush_interval = flush_interval
+        self.sequence_token = None
+        self.stream_ready = False
+        self.events = []
+        self.events_lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="cloudwatch-logs-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def log(self, message):
+        # Oversized events are rejected by the API, keep the start of the message
+        message = message.encode('utf-8')[:max_event_bytes - event_overhead_bytes].decode('utf-8', 'ignore')
+        with self.events_lock:
+            self.events.append({'timestamp': int(datetime.now().timestamp() * 1000), 'message': message})
+            batch_full = len(self.events) >= max_batch_events
+        if batch_full:
+            self.wake_event.set()
+
+    def flush(self):
+        with self.events_lock:
+            events, self.events = self.events, []
+        if not events:
             return
 
-        sequence_token = log_streams[0].get('uploadSequenceToken')
+        # Events in a batch must be in chronological order
+        events.sort(key=lambda event: event['timestamp'])
+        with self.send_lock:
+            if not self.stream_ready:
+                self._resolve_stream()
+            for batch in self._batches(events):
+                self._put_log_events(batch)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.wake_event.set()
+        self.thread.join(timeout=self.flush_interval)
+        self.flush()
+
+    def _run(self):
+        while not self.closed:
+            self.wake_event.wait(self.flush_interval)
+            self.wake_event.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Failed to log to CloudWatch: {e}")
+
+    def _resolve_stream(self):
+        response = get_cloudwatch_logs_client().describe_log_streams(
+            logGroupName=self.group_name,
+            logStreamNamePrefix=self.stream_name
+        )
+        log_streams = [stream for stream in response['logStreams'] if stream['logStreamName'] == self.stream_name]
+        if log_streams:
+            self.sequence_token = log_streams[0].get('uploadSequenceToken')
+        else:
+            get_cloudwatch_logs_client().create_log_stream(logGroupName=self.group_name, logStreamName=self.stream_name)
+            print(f"Log stream '{self.stream_name}' created successfully in log group '{self.group_name}'.")
+        self.stream_ready = True
+
+    def _batches(self, events):
+        batch, batch_bytes = [], 0
+        for event in events:
+            event_bytes = len(event['message'].encode('utf-8')) + event_overhead_bytes
+            if batch and (len(batch) >= max_batch_events
+                          or batch_bytes + event_bytes > max_batch_bytes
+                          or event['timestamp'] - batch[0]['timestamp'] >= max_batch_span_ms):
+                yield batch
+                batch, batch_bytes = [], 0
+            batch.append(event)
+            batch_bytes += event_bytes
+        if batch:
+            yield batch
+
+    def _put_log_events(self, batch, retry=True):
         log_event = {
-            'logGroupName': log_group_name,
-            'logStreamName': log_stream_name,
-            'logEvents': [
-                {
-                    'timestamp': int(datetime.now().timestamp() * 1000),
-                    'message': message
-                }
-            ]
+            'logGroupName': self.group_name,
+            'logStreamName': self.stream_name,
+            'logEvents': batch
         }
-        if sequence_token:
-            log_event['sequenceToken'] = sequence_token
+        if self.sequence_token:
+            log_event['sequenceToken'] = self.sequence_token
 
-        response = cloudwatch_logs_client.put_log_events(**log_event)
-        print("Log event sent to CloudWatch:", response)
+        try:
+            response = get_cloudwatch_logs_client().put_log_events(**log_event)
+            self.sequence_token = response.get('nextSequenceToken')
+        except get_cloudwatch_logs_client().exceptions.InvalidSequenceTokenException as e:
+            # Another writer used the stream, retry once with the token it expects
+            self.sequence_token = e.response.get('expectedSequenceToken')
+            if retry:
+                self._put_log_events(batch, retry=False)
+            else:
+                print(f"Failed to log to CloudWatch: {e}")
+        except get_cloudwatch_logs_client().exceptions.DataAlreadyAcceptedException as e:
+            self.sequence_token = e.response.get('expectedSequenceToken')
+
+# Shared writer, created on the first log_to_cloudwatch call
+cloudwatch_logs_writer = None
+cloudwatch_logs_writer_lock = threading.Lock()
+
+def log_to_cloudwatch(message):
+    global cloudwatch_logs_writer
+    try:
+        with cloudwatch_logs_writer_lock:
+            if cloudwatch_logs_writer is None:
+                cloudwatch_logs_writer = CloudWatchLogsWriter()
+        cloudwatch_logs_writer.log(message)
     except Exception as e:
         print(f"Failed to log to CloudWatch: {e}")
 
+# Error log sink: log_error entries are buffered in memory and written as one
+# NDJSON object per process, or in parts when the buffer grows past
+# error_log_flush_bytes, so logging an error never waits on S3
+error_log = {"run_id": uuid.uuid4().hex, "part": 0, "entries": [], "size": 0}
+error_log_lock = threading.Lock()
+
 def log_error(error_message, record=None):
     log_entry = {
         "timestamp": str(datetime.now()),
         "error_message": error_message,
         "record": record
     }
-    logging.error(json.dumps(log_entry))
-    # log_to_cloudwatch(json.dumps(log_entry))
-    save_log_to_s3(log_entry)
+    line = json.dumps(log_entry, default=str)
+    logging.error(line)
+    log_to_cloudwatch(line)
+
+    with error_log_lock:
+        error_log["entries"].append(line)
+        error_log["size"] += len(line) + 1
+        should_flush = error_log["size"] >= error_log_flush_bytes
+    if should_flush:
+        flush_error_log()
+
+def flush_error_log():
+    with error_log_lock:
+        if not error_log["entries"]:
+            return
+        body = "\n".join(error_log["entries"]) + "\n"
+        s3_key = f"logs/{datetime.now().strftime('%Y-%m-%d')}/errors_{error_log['run_id']}_{error_log['part']:03d}.ndjson"
+        error_log.update(part=error_log["part"] + 1, entries=[], size=0)
+
+    try:
+        get_s3_client().put_object(
+            Bucket=s3_bucket_name,
+            Key=s3_key,
+            Body=body,
+            ContentType="application/x-ndjson"
+        )
+    except NoCredentialsError as e:
+        print("Credentials not available for S3: ", e)
+    except (ClientError, BotoCoreError) as e:
+        print(f"Failed to save error log to S3: {e}")
+
+# Buffered errors reach S3 when the process exits
+atexit.register(flush_error_log)
 
 def save_log_to_s3(log_entry):
-    # Shorten and sanitize the error message for S3 filename compatibility
-    brief_error = log_entry["error_message"].replace(" ", "_").replace("/", "_")[:50]  # Truncate to 50 characters for readability
-    
-    s3_key = f"logs/{datetime.now().strftime('%Y-%m-%d')}/error_{brief_error}_{datetime.now().strftime('%H-%M-%S')}.json"
+    # Shorten and sanitize the error message, or the stage of a non-error
+    # entry, for S3 filename compatibility
+    if "error_message" in log_entry:
+        brief_name = "error_" + str(log_entry["error_message"])
+    else:
+        brief_name = str(log_entry.get("stage", "log"))
+    brief_name = brief_name.replace(" ", "_").replace("/", "_")[:50]  # Truncate to 50 characters for readability
+
+    s3_key = f"logs/{datetime.now().strftime('%Y-%m-%d')}/{brief_name}_{datetime.now().strftime('%H-%M-%S')}.json"
 
     try:
-        s3_client.put_object(
+        get_s3_client().put_object(
             Bucket=s3_bucket_name,
             Key=s3_key,
             Body=json.dumps(log_entry),
@@ -92,12 +256,9 @@ def save_log_to_s3(log_entry):
     except NoCredentialsError as e:
         print("Credentials not available for S3: ", e)
 
-# Initialize CloudWatch client
-cloudwatch_client = boto3.client('cloudwatch', region_name='ap-southeast-2')
-
 def send_metrics_to_cloudwatch(metric_name, value, unit="Count"):
     try:
-        response = cloudwatch_client.put_metric_data(
+        response = get_cloudwatch_client().put_metric_data(
             Namespace='ZohoCRM_MongoDB_Migration',
             MetricData=[
                 {
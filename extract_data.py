@@ -1,19 +1,25 @@
-import requests
 import boto3
+import functools
 import json
-import time
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import boto3
 from aws_util import log_error, send_metrics_to_cloudwatch, log_to_cloudwatch, save_log_to_s3
+# Zoho token cache, adaptive rate limiter and retrying GET, shared with the Lambda pipeline
+from lambda_function import get_access_token, zoho_get
 
 # log_to_cloudwatch("Starting data extraction from Zoho CRM")
 
-# Initialize AWS Secrets Manager client
-secrets_client = boto3.client('secretsmanager', region_name='ap-southeast-2')
+# Initialize AWS Secrets Manager client on first use
+@functools.lru_cache(maxsize=None)
+def get_secrets_client():
+    return boto3.client('secretsmanager', region_name='ap-southeast-2')
 
 # Retrieve Zoho API and MongoDB credentials from Secrets Manager
 def get_zoho_secret(secret_name):
-    response = secrets_client.get_secret_value(SecretId=secret_name)
+    response = get_secrets_client().get_secret_value(SecretId=secret_name)
     return json.loads(response['SecretString'])
 
 # # Example of getting and printing the secret content
@@ -23,92 +29,84 @@ def get_zoho_secret(secret_name):
 # mongodb_secret = get_zoho_secret("zohocrmmig")
 # print("MongoDB Secret:", mongodb_secret)
 
-# Zoho credentials from Secrets Manager
-print("Fetching Zoho CRM credentials...")
-
-zoho_credentials = get_zoho_secret("zoho_crm_credentials")
-client_id = zoho_credentials['ZOHO_CLIENT_ID']
-client_secret = zoho_credentials['ZOHO_SECRET']
-refresh_token = zoho_credentials['ZOHO_REFRESH_TOKEN']
 zoho_base_url = "https://www.zohoapis.com.au/crm/v2/Leads"
+num_fetch_workers = int(os.environ.get("NUM_FETCH_WORKERS", "4"))
 
 # fields=First_Name,Last_Name,Email,Phone,Company,Industry,Lead_Status??per_page=20&page=1
-print("Zoho CRM credentials retrieved successfully.")
-Accounts_URL= "https://accounts.zoho.com.au"
-
-# token_url = "https://accounts.zoho.com.au/oauth/v2/token"
-token_url = f'{Accounts_URL}/oauth/v2/token?refresh_token={refresh_token}&client_id={client_id}&client_secret={client_secret}&grant_type=refresh_token'
-
-# Retrieve and refresh access token using client ID, client secret, and refresh token
-def get_access_token():
-    print("Refreshing access token...")
-    # params = {
-    #     "refresh_token": refresh_token,
-    #     "client_id": client_id,
-    #     "client_secret": client_secret,
-    #     "grant_type": "refresh_token"
-    # , params=params
-    # }
-    response = requests.post(token_url)
-    response_data = response.json()
-
-    # Debug response to check for errors
-    print("Zoho Token Response:", response_data)
-    
-    if "access_token" in response_data:
-        print("Access token retrieved successfully.")
-        return response_data["access_token"]
-    else:
-        # Log error if token refresh fails
-        log_error("Token refresh failed: " + response_data.get("error", "Unknown error"))
-        raise Exception("Failed to retrieve access token")
+
+# Fetch a single page of leads, returns None when Zoho has no more data
+def fetch_leads_page(headers, params, page, stop_event):
+    if stop_event.is_set():
+        return None
+
+    print(f"Fetching page {page} of leads...")
+    response = zoho_get(zoho_base_url, headers, {**params, "page": page})
+    if response.status_code == 204:
+        return None
+    response.raise_for_status()
+    data = response.json()
+
+    # Debug response to check for data
+    print("API Response:", data)
+    return data.get("data") or None
 
 # Function to fetch leads from Zoho CRM
-def fetch_leads(max_records=1500):
+def fetch_leads(max_records=1500, num_workers=num_fetch_workers):
     print("Fetching leads from Zoho CRM...")
     zoho_api_token = get_access_token()
     headers = {"Authorization": f"Zoho-oauthtoken {zoho_api_token}"}
-    zoho_base_url = "https://www.zohoapis.com.au/crm/v2/Leads"
     leads = []
-    page = 1
     per_page = 200  # Number of records per page
     params = {
         "fields": "First_Name,Last_Name,Email,Phone,Company,Industry,Lead_Status",
-        "per_page": per_page,
-        "page": page
+        "per_page": per_page
     }
 
-    while len(leads) < max_records:
-        print(f"Fetching page {page} of leads...")
+    # Fetch up to num_workers pages at once, merging them back in page order
+    max_pages = -(-max_records // per_page)
+    stop_event = threading.Event()
+    futures = {}
+    next_page, page = 1, 1
+
+    with ThreadPoolExecutor(max_workers=max(1, num_workers)) as executor:
         try:
-            response = requests.get(zoho_base_url, headers=headers, params=params)
-            data = response.json()
-
-            # Debug response to check for data
-            print("API Response:", data)
-            
-            # Check if 'data' exists in the response
-            if 'data' in data:
-                leads.extend(data['data'])
-                print(f"Retrieved {len(data['data'])} leads from page {page}.")
-                # send_metrics_to_cloudwatch("RecordsProcessed", len(data["data"]))
-
-                # Check if we've reached the max_records
-                if len(leads) >= max_records:
+            while page <= max_pages:
+                while next_page <= max_pages and len(futures) < num_workers and not stop_event.is_set():
+                    futures[next_page] = executor.submit(fetch_leads_page, headers, params, next_page, stop_event)
+                    next_page += 1
+
+                try:
+                    page_data = futures.pop(page).result()
+                except Exception as e:
+                    # Log error and mark as failed in CloudWatch
+                    # log_to_cloudwatch(f"Error fetching leads on page {page}: {str(e)}")
+                    # send_metrics_to_cloudwatch("FailedRecords", 1)
+                    log_error(str(e), record=page)
+                    # A page that still fails after the retries fails the extraction,
+                    # a partial dataset must not be loaded as if it were complete
+                    raise
+
+                # Check if 'data' exists in the response
+                if not page_data:
+                    print("No more leads to fetch.")
+                    break
+
+                leads.extend(page_data)
+                print(f"Retrieved {len(page_data)} leads from page {page}.")
+                # send_metrics_to_cloudwatch("RecordsProcessed", len(page_data))
+
+                # Check if we've reached the max_records or the last page
+                if len(leads) >= max_records or len(page_data) < per_page:
                     leads = leads[:max_records]  # Trim to the exact max_records
                     break
 
                 page += 1
-                params["page"] = page  # Update the page parameter
-            else:
-                print("No more leads to fetch.")
-                break
-        except Exception as e:
-            # Log error and mark as failed in CloudWatch
-            # log_to_cloudwatch(f"Error fetching leads on page {page}: {str(e)}")
-            # send_metrics_to_cloudwatch("FailedRecords", 1)
-            log_error(str(e), record=page)
-            break
+
+        finally:
+            # Stop the remaining workers and drop queued pages
+            stop_event.set()
+            for future in futures.values():
+                future.cancel()
 
     print(f"Total leads fetched: {len(leads)}")
 
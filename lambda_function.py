@@ -1,21 +1,43 @@
 
+import atexit
+import bisect
+import contextlib
+import csv
+import functools
 import logging
 import json
-import hashlib
+import gzip
+import io
+import zlib
+import zipfile
+import os
+import random
+import threading
+import uuid
 import boto3
-import requests
-from datetime import datetime
-from botocore.exceptions import ClientError
-from botocore.exceptions import NoCredentialsError, ClientError
-from pymongo import MongoClient
-import pymongo
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from botocore.exceptions import BotoCoreError, NoCredentialsError, ClientError
+# requests, pymongo and hashlib are imported where they are used, so runs that
+# stop at the ETL status check do not pay for them at cold start
 # from aws_util import log_error, send_metrics_to_cloudwatch, save_log_to_s3
 
-# AWS clients (all start with 'c')
+# AWS clients (all start with 'c'), created on first use and kept for warm invocations
 region_name = 'ap-southeast-2'
-cloudwatch_client = boto3.client('cloudwatch', region_name=region_name)
-s3_client = boto3.client('s3')
-secrets_client = boto3.client('secretsmanager', region_name=region_name)
+
+@functools.lru_cache(maxsize=None)
+def get_cloudwatch_client():
+    return boto3.client('cloudwatch', region_name=region_name)
+
+@functools.lru_cache(maxsize=None)
+def get_s3_client():
+    return boto3.client('s3')
+
+@functools.lru_cache(maxsize=None)
+def get_secrets_client():
+    return boto3.client('secretsmanager', region_name=region_name)
 
 # Configuration (all start with 'c', 'd', 'n', 's', 'z')
 ca_ec2_bundle_path = "/home/ubuntu/etl/zoho-crm-migration-script/global-bundle.pem"
@@ -23,16 +45,71 @@ ca_lambda_bundle_path = "/tmp/global-bundle.pem"
 cluster_identifier = "docdb-cluster"
 count_discrepancies_key = f"count/count_discrepancies_{datetime.now().strftime('%Y-%m-%d')}.json"
 data_discrepancies_key = f"disrepancies/discrepancies_{datetime.now().strftime('%Y-%m-%d')}.json"
-num_fetch_data = 250
+reconciliation_key = f"reconciliation/reconciliation_{datetime.now().strftime('%Y-%m-%d')}.json"
+num_fetch_data = int(os.environ.get("ETL_MAX_RECORDS", "250"))  # Leads per run, raise it for a full migration so Bulk Read can be picked
+num_fetch_workers = int(os.environ.get("NUM_FETCH_WORKERS", "4"))
+stream_mode = os.environ.get("ETL_STREAM_MODE", "false").lower() == "true"
+use_watermark = os.environ.get("ETL_USE_WATERMARK", "true").lower() == "true"
+upsert_batch_size = int(os.environ.get("UPSERT_BATCH_SIZE", "500"))
+mongo_database = "zoho_crm"
+mongo_max_pool_size = int(os.environ.get("MONGO_MAX_POOL_SIZE", "10"))
+lookup_chunk_size = int(os.environ.get("LOOKUP_CHUNK_SIZE", "1000"))  # Zoho ids per $in query
+lookup_cursor_batch_size = 1000  # Documents per getMore while reading a lookup back
+reconcile_num_buckets = int(os.environ.get("RECONCILE_NUM_BUCKETS", "1024"))
+fanout_num_workers = int(os.environ.get("FANOUT_NUM_WORKERS", "4"))
+fanout_dispatch = os.environ.get("FANOUT_DISPATCH", "lambda").lower()  # "lambda" in production, "local" for testing
+fanout_function_name = os.environ.get("FANOUT_FUNCTION_NAME", os.environ.get("AWS_LAMBDA_FUNCTION_NAME"))
+run_log_flush_bytes = int(os.environ.get("RUN_LOG_FLUSH_BYTES", str(1024 * 1024)))
+metrics_mode = os.environ.get("METRICS_MODE", "api").lower()  # "api" for PutMetricData, "emf" for stdout
+metrics_batch_size = 1000  # PutMetricData accepts up to 1000 metrics per call
+metrics_emf_max_values = 100  # EMF accepts up to 100 values per metric
+profile_mode = os.environ.get("ETL_PROFILE", "off").lower()  # "cprofile" dumps a profile of every run to S3
 
 s3_bucket_name = "zoho-mig-mgdb-cf-log"
-s3_key_backup_leads = f"backup/leads_{datetime.now().strftime('%Y-%m-%d')}.json"
+snapshot_format = os.environ.get("SNAPSHOT_FORMAT", "ndjson").lower()  # "parquet" writes a columnar snapshot, needs pyarrow
+backup_key_suffix = ".parquet" if snapshot_format == "parquet" else ".ndjson.gz"
+s3_key_backup_leads = f"backup/leads_{datetime.now().strftime('%Y-%m-%d')}{backup_key_suffix}"
+backup_part_size = 8 * 1024 * 1024  # S3 multipart parts must be at least 5 MiB, except the last one
+backup_upload_workers = int(os.environ.get("BACKUP_UPLOAD_WORKERS", "4"))
 status_key = "etl_status/etl_status.json"
 zoho_base_url = "https://www.zohoapis.com.au/crm/v2/Leads"
+zoho_count_url = "https://www.zohoapis.com.au/crm/v2.1/Leads/actions/count"
+zoho_token_url = "https://accounts.zoho.com.au/oauth/v2/token"
+zoho_bulk_read_url = "https://www.zohoapis.com.au/crm/bulk/v2/read"
+zoho_token_refresh_margin = 300  # Refresh the access token this many seconds before it expires
+zoho_lead_fields = "First_Name,Last_Name,Email,Phone,Company,Industry,Lead_Status,Modified_Time"
+zoho_per_page = 200
+zoho_rate_limit = float(os.environ.get("ZOHO_RATE_LIMIT", "10"))  # Starting requests per second, tuned by response headers
+zoho_rate_burst = int(os.environ.get("ZOHO_RATE_BURST", str(max(1, num_fetch_workers))))
+zoho_max_retries = int(os.environ.get("ZOHO_MAX_RETRIES", "5"))
+zoho_backoff_base = 1.0  # Seconds, doubled on every retry and jittered
+zoho_backoff_max = 60.0
+zoho_retry_statuses = (429, 500, 502, 503, 504)
+bulk_read_threshold = int(os.environ.get("BULK_READ_THRESHOLD", "20000"))  # Full extractions above this many leads use Bulk Read, 0 disables it
+bulk_read_poll_interval = float(os.environ.get("BULK_READ_POLL_INTERVAL", "10"))
+bulk_read_timeout = float(os.environ.get("BULK_READ_TIMEOUT", "600"))
+bulk_read_batch_size = 2000  # Leads per batch handed to the load, and per Parquet row group
+bulk_read_download_path = "/tmp/zoho_bulk_read.zip"
+lead_digest_fields = ["First_Name", "Last_Name", "Email", "Phone", "Company", "Industry", "Lead_Status"]
+snapshot_read_columns = ["id"] + lead_digest_fields  # All that validation and reconciliation read from a Parquet snapshot
 
 # Set up the logging configuration
 logging.basicConfig(level=logging.INFO)
 
+# Keep-alive HTTP session for all Zoho calls, survives between warm invocations
+@functools.lru_cache(maxsize=None)
+def get_zoho_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    zoho_session = requests.Session()
+    zoho_session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=max(10, num_fetch_workers)))
+    return zoho_session
+
+# Zoho OAuth token cache, shared by every stage of a run and by warm invocations
+zoho_token_cache = {"access_token": None, "expires_at": 0}
+zoho_token_lock = threading.RLock()
+
 def save_log_to_s3_with_stage(stage, message, status="IN_PROGRESS"):
     log_entry = {
         "stage": stage,
@@ -54,33 +131,54 @@ def log_error(error_message, record=None):
     # log_to_cloudwatch(json.dumps(log_entry))
     save_log_to_s3(log_entry)
 
-def save_log_to_s3(log_entry):
-    # Set the log file name based on status
-    status = log_entry.get("status", "IN_PROGRESS")
+# Run log sink: entries are buffered in memory and written as one NDJSON object
+# per invocation, or in parts when the buffer grows past run_log_flush_bytes
+run_log = {"run_id": uuid.uuid4().hex, "part": 0, "entries": [], "size": 0}
+run_log_lock = threading.Lock()
 
-    if status == "ERROR":
-        # Use error-specific file name
-        brief_error = log_entry.get("error", "").replace(" ", "_").replace("/", "_")[:20]  # Truncate to 50 characters for readability
-        s3_key = f"logs/{datetime.now().strftime('%Y-%m-%d')}/error_{brief_error}.json"
+def start_run_log(run_id=None):
+    with run_log_lock:
+        run_log.update(run_id=run_id or uuid.uuid4().hex, part=0, entries=[], size=0)
 
-    else:
-        # Use success-specific file name
-        brief_message = log_entry.get("message", "").replace(" ", "_").replace("/", "_")[:20]
-        s3_key = f"logs/{datetime.now().strftime('%Y-%m-%d')}/success_{brief_message}.json"
+def save_log_to_s3(log_entry):
+    line = json.dumps(log_entry, default=str)
+    with run_log_lock:
+        run_log["entries"].append(line)
+        run_log["size"] += len(line) + 1
+        should_flush = run_log["size"] >= run_log_flush_bytes
+    if should_flush:
+        flush_run_log()
+
+def flush_run_log():
+    with run_log_lock:
+        if not run_log["entries"]:
+            return
+        body = "\n".join(run_log["entries"]) + "\n"
+        s3_key = f"logs/{datetime.now().strftime('%Y-%m-%d')}/run_{run_log['run_id']}_{run_log['part']:03d}.ndjson"
+        run_log.update(part=run_log["part"] + 1, entries=[], size=0)
 
     try:
-        s3_client.put_object(
+        get_s3_client().put_object(
             Bucket=s3_bucket_name,
             Key=s3_key,
-            Body=json.dumps(log_entry),
-            ContentType="application/json"
+            Body=body,
+            ContentType="application/x-ndjson"
         )
     except NoCredentialsError as e:
         print("Credentials not available for S3: ", e)
+    except (ClientError, BotoCoreError) as e:
+        print(f"Failed to save run log to S3: {e}")
+
+# Entries logged outside lambda_handler still reach S3 when the process exits
+atexit.register(flush_run_log)
 
 # Initialize CloudWatch client
 # cloudwatch_client = boto3.client('cloudwatch', region_name=region_name)
 
+# Metrics aggregator: statistic set per (namespace, metric, unit, dimension)
+metrics_buffer = {}
+metrics_lock = threading.Lock()
+
 def send_metrics_to_cloudwatch(
     metric_name, 
     value, 
@@ -90,7 +188,11 @@ def send_metrics_to_cloudwatch(
     dimension_value="ZohoToMongoDB"
 ):
     """
-    Sends a custom metric to Amazon CloudWatch.
+    Records a custom metric for Amazon CloudWatch.
+
+    Data points are aggregated in process and sent by flush_metrics, as
+    statistic sets through PutMetricData or as Embedded Metric Format
+    documents on stdout when METRICS_MODE is "emf".
 
     Parameters:
     - metric_name (str): The name of the metric.
@@ -100,40 +202,295 @@ def send_metrics_to_cloudwatch(
     - dimension_name (str): The name of the metric dimension.
     - dimension_value (str): The value for the metric dimension.
     """
-    try:
-        response = cloudwatch_client.put_metric_data(
-            Namespace = namespace,
-            MetricData=[
+    key = (namespace, metric_name, unit, dimension_name, dimension_value)
+    with metrics_lock:
+        stats = metrics_buffer.setdefault(key, {"SampleCount": 0, "Sum": 0, "Minimum": value, "Maximum": value, "Values": []})
+        stats["SampleCount"] += 1
+        stats["Sum"] += value
+        stats["Minimum"] = min(stats["Minimum"], value)
+        stats["Maximum"] = max(stats["Maximum"], value)
+        if metrics_mode == "emf":
+            stats["Values"].append(value)
+
+def flush_metrics():
+    with metrics_lock:
+        buffered = dict(metrics_buffer)
+        metrics_buffer.clear()
+    if not buffered:
+        return
+
+    if metrics_mode == "emf":
+        # Metrics are extracted from the Lambda log, no API calls at all
+        timestamp = int(datetime.now().timestamp() * 1000)
+        for (namespace, metric_name, unit, dimension_name, dimension_value), stats in buffered.items():
+            values = stats["Values"]
+            for start in range(0, len(values), metrics_emf_max_values):
+                print(json.dumps({
+                    "_aws": {
+                        "Timestamp": timestamp,
+                        "CloudWatchMetrics": [{
+                            "Namespace": namespace,
+                            "Dimensions": [[dimension_name]],
+                            "Metrics": [{"Name": metric_name, "Unit": unit}]
+                        }]
+                    },
+                    dimension_name: dimension_value,
+                    metric_name: values[start:start + metrics_emf_max_values]
+                }))
+        return
+
+    # One statistic set per metric, sent in batches of metrics_batch_size per namespace
+    metric_data = {}
+    for (namespace, metric_name, unit, dimension_name, dimension_value), stats in buffered.items():
+        metric_data.setdefault(namespace, []).append({
+            'MetricName': metric_name,
+            'Dimensions': [
                 {
-                    'MetricName': metric_name,
-                    'Dimensions': [
-                        {
-                            'Name': dimension_name,
-                            'Value': dimension_value
-                        }
-                    ],
-                    'Value': value,
-                    'Unit': unit
-                },
-            ]
-        )
-        print(f"Metric {metric_name} sent to CloudWatch successfully:", response)
-    except ClientError as e:
-        print(f"Failed to send metric to CloudWatch: {e}")
-
+                    'Name': dimension_name,
+                    'Value': dimension_value
+                }
+            ],
+            'StatisticValues': {key: stats[key] for key in ("SampleCount", "Sum", "Minimum", "Maximum")},
+            'Unit': unit
+        })
+
+    for namespace, data in metric_data.items():
+        for start in range(0, len(data), metrics_batch_size):
+            try:
+                get_cloudwatch_client().put_metric_data(Namespace=namespace, MetricData=data[start:start + metrics_batch_size])
+                print(f"Sent {len(data[start:start + metrics_batch_size])} metrics to CloudWatch namespace {namespace}.")
+            except (ClientError, BotoCoreError) as e:
+                print(f"Failed to send metrics to CloudWatch: {e}")
+
+# Buffered metrics are not lost when the process exits outside lambda_handler
+atexit.register(flush_metrics)
+
+# Timing spans: wall time of each stage and external call, aggregated per run
+# into the run log and sent as one SpanDuration metric per span with a Span dimension
+run_timings = {}
+run_timings_lock = threading.Lock()
+
+@contextlib.contextmanager
+def timed_span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with run_timings_lock:
+            span = run_timings.setdefault(name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+            span["count"] += 1
+            span["seconds"] += elapsed
+            span["max_seconds"] = max(span["max_seconds"], elapsed)
+
+def start_run_timings():
+    with run_timings_lock:
+        run_timings.clear()
+
+# Log the per-run timing breakdown, slowest spans first. Runs skipped at the
+# ETL status check pass send_metrics=False, so they never build a CloudWatch client
+def report_run_timings(send_metrics=True):
+    with run_timings_lock:
+        spans = sorted(run_timings.items(), key=lambda item: item[1]["seconds"], reverse=True)
+        run_timings.clear()
+    if not spans:
+        return
+
+    breakdown = {
+        name: {"count": span["count"], "seconds": round(span["seconds"], 4), "max_seconds": round(span["max_seconds"], 4)}
+        for name, span in spans
+    }
+    for name, span in breakdown.items():
+        print(f"{name}: {span['seconds']:.3f}s over {span['count']} calls")
+        if send_metrics:
+            send_metrics_to_cloudwatch("SpanDuration", span["seconds"] * 1000, unit="Milliseconds",
+                                       dimension_name="Span", dimension_value=name)
+    save_log_to_s3({"stage": "Timing Breakdown", "timestamp": str(datetime.now()), "spans": breakdown})
+
+# Opt-in cProfile of the handler thread, enabled by ETL_PROFILE=cprofile or
+# {"profile": true} in the event. Fetch and upload threads are not profiled,
+# their time shows up in the timing spans instead
+def start_profiler(event):
+    if not (event.get("profile") or profile_mode == "cprofile"):
+        return None
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+def save_profile_to_s3(profiler):
+    import marshal
+    import pstats
+
+    profiler.disable()
+    profiler.create_stats()
+    s3_key = f"profiles/{datetime.now().strftime('%Y-%m-%d')}/run_{run_log['run_id']}.prof"
+    try:
+        # Same format as cProfile's dump_stats, readable with pstats or snakeviz
+        get_s3_client().put_object(Bucket=s3_bucket_name, Key=s3_key, Body=marshal.dumps(profiler.stats))
+    except (NoCredentialsError, ClientError) as e:
+        print(f"Failed to save profile to S3: {e}")
+        return
+
+    # The hot spots also go to the run log, so a quick look needs no download
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(25)
+    save_log_to_s3({
+        "stage": "Profile",
+        "timestamp": str(datetime.now()),
+        "profile_key": s3_key,
+        "top_functions": summary.getvalue()
+    })
 
 
 # Function to fetch Zoho CRM API token
 def get_zoho_secret(secret_name):
-    response = secrets_client.get_secret_value(SecretId=secret_name)
+    response = get_secrets_client().get_secret_value(SecretId=secret_name)
     return json.loads(response['SecretString'])
 
-def get_access_token():
+def get_access_token(force_refresh=False):
+    with zoho_token_lock:
+        # Reuse the cached token until it gets close to its expiry time
+        if (not force_refresh and zoho_token_cache["access_token"]
+                and time.time() < zoho_token_cache["expires_at"] - zoho_token_refresh_margin):
+            return zoho_token_cache["access_token"]
+
+        credentials = get_zoho_secret("zoho_crm_credentials")
+        params = {
+            "refresh_token": credentials['ZOHO_REFRESH_TOKEN'],
+            "client_id": credentials['ZOHO_CLIENT_ID'],
+            "client_secret": credentials['ZOHO_SECRET'],
+            "grant_type": "refresh_token"
+        }
+        with timed_span("zoho.token"):
+            response_data = get_zoho_session().post(zoho_token_url, params=params).json()
+        if "access_token" not in response_data:
+            raise Exception(f"Failed to retrieve access token: {response_data.get('error', 'Unknown error')}")
+
+        zoho_token_cache["access_token"] = response_data["access_token"]
+        zoho_token_cache["expires_at"] = time.time() + int(response_data.get("expires_in", 3600))
+        return zoho_token_cache["access_token"]
 
-    credentials = get_zoho_secret("zoho_crm_credentials")
-    token_url = f"https://accounts.zoho.com.au/oauth/v2/token?refresh_token={credentials['ZOHO_REFRESH_TOKEN']}&client_id={credentials['ZOHO_CLIENT_ID']}&client_secret={credentials['ZOHO_SECRET']}&grant_type=refresh_token"
-    response = requests.post(token_url)
-    return response.json()["access_token"]
+def get_zoho_headers():
+    return {"Authorization": f"Zoho-oauthtoken {get_access_token()}"}
+
+# Seconds until a header's deadline: Retry-After is a delay, rate limit
+# resets come as epoch seconds or milliseconds
+def get_header_seconds(response, header):
+    try:
+        value = float(response.headers.get(header))
+    except (TypeError, ValueError):
+        return None
+    if value > 1e12:
+        return max(0.0, value / 1000 - time.time())
+    if value > 1e9:
+        return max(0.0, value - time.time())
+    return value
+
+# Adaptive token bucket shared by every Zoho API call of the container
+class ZohoRateLimiter:
+    """
+    Spaces Zoho API requests out to stay just under the org's limits.
+
+    Tokens refill at `rate` per second up to `burst`. The rate creeps up
+    after successful responses, halves on HTTP 429 and is capped by the
+    X-RATELIMIT-REMAINING budget left until X-RATELIMIT-RESET. A 429 with
+    Retry-After, or an exhausted budget, pauses every worker until then.
+    """
+
+    def __init__(self, rate, burst=1, min_rate=0.5, max_rate=None):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate * 4
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.decreased_at = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def update(self, response):
+        retry_after = get_header_seconds(response, "Retry-After")
+        remaining = response.headers.get("X-RATELIMIT-REMAINING")
+        reset_in = get_header_seconds(response, "X-RATELIMIT-RESET")
+        with self.lock:
+            now = time.monotonic()
+            if response.status_code == 429:
+                # Concurrent workers throttled by the same burst only slow down once
+                if now - self.decreased_at >= 1.0:
+                    self.rate = max(self.min_rate, self.rate / 2)
+                    self.decreased_at = now
+                self.tokens = 0.0
+                self.paused_until = max(self.paused_until, now + (retry_after or 0))
+                return
+
+            self.rate = min(self.max_rate, self.rate + 0.1)
+            if remaining is not None and remaining.isdigit() and reset_in:
+                if int(remaining) == 0:
+                    self.paused_until = max(self.paused_until, now + reset_in)
+                else:
+                    self.rate = min(self.rate, max(self.min_rate, int(remaining) / reset_in))
+
+zoho_rate_limiter = ZohoRateLimiter(zoho_rate_limit, zoho_rate_burst)
+
+# Send a Zoho API request through the rate limiter, retrying throttled and
+# failed requests with jittered exponential backoff. An access token that
+# expired or was revoked mid-run (HTTP 401) is refreshed once and the request
+# sent again; `headers` is updated in place, so callers sharing it pick the new
+# token up too
+def zoho_request(method, url, headers, span_name="zoho.request", **kwargs):
+    import requests
+
+    token_refreshed = False
+    for attempt in range(zoho_max_retries + 1):
+        with timed_span("zoho.rate_limit_wait"):
+            zoho_rate_limiter.acquire()
+        sent_authorization = headers.get("Authorization")
+        try:
+            with timed_span(span_name):
+                response = get_zoho_session().request(method, url, headers=dict(headers), **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == zoho_max_retries:
+                raise
+            print(f"Zoho request failed: {e}, retrying...")
+            retry_after = None
+        else:
+            zoho_rate_limiter.update(response)
+            if response.status_code == 401 and not token_refreshed and attempt < zoho_max_retries:
+                token_refreshed = True
+                # Workers sharing the headers refresh the rejected token only once
+                with zoho_token_lock:
+                    if headers.get("Authorization") == sent_authorization:
+                        print("Zoho rejected the access token, refreshing...")
+                        headers["Authorization"] = f"Zoho-oauthtoken {get_access_token(force_refresh=True)}"
+                continue
+            if response.status_code not in zoho_retry_statuses:
+                return response
+            if attempt == zoho_max_retries:
+                response.raise_for_status()
+            print(f"Zoho answered {response.status_code}, retrying...")
+            retry_after = get_header_seconds(response, "Retry-After")
+
+        send_metrics_to_cloudwatch("ZohoRetries", 1)
+        backoff = random.uniform(0, min(zoho_backoff_max, zoho_backoff_base * 2 ** attempt))
+        with timed_span("zoho.backoff"):
+            time.sleep(max(retry_after or 0, backoff))
+
+def zoho_get(url, headers, params=None, span_name="zoho.get"):
+    return zoho_request("GET", url, headers, span_name, params=params)
 
 # # get the document db uri
 # def get_documentdb_uri(cluster_identifier):
@@ -158,6 +515,8 @@ def get_access_token():
 
 # Download CA certificate for MongoDB
 def download_ca_certificate():
+    import requests
+
     url = "https://truststore.pki.rds.amazonaws.com/global/global-bundle.pem"
     response = requests.get(url)
     if response.status_code == 200:
@@ -169,40 +528,88 @@ def download_ca_certificate():
 # Check if ETL process should run
 def load_etl_status_from_s3():
     try:
-        response = s3_client.get_object(Bucket=s3_bucket_name, Key=status_key)
-        status = json.loads(response['Body'].read().decode('utf-8'))
-    except s3_client.exceptions.NoSuchKey:
+        with timed_span("s3.get_object"):
+            response = get_s3_client().get_object(Bucket=s3_bucket_name, Key=status_key)
+            status = json.loads(response['Body'].read().decode('utf-8'))
+    except get_s3_client().exceptions.NoSuchKey:
         status = {"run_etl": True}
     return status
 
-def update_etl_status_in_s3(run_etl):
+def update_etl_status_in_s3(run_etl, last_modified_time=None):
     status = {"run_etl": run_etl}
-    s3_client.put_object(Bucket=s3_bucket_name, Key=status_key, Body=json.dumps(status))
 
-# Check if MongoDB count matches Zoho count and log
-def check_record_count():
-    # MongoDB connection
-    username, password, host, port = get_mongo_credentials()
-    database = "zoho_crm"
-    mongo_uri = f"mongodb://{username}:{password}@{host}:{port}/{database}?tls=true&retryWrites=false&tlsCAFile={ca_ec2_bundle_path}"
-    client = MongoClient(mongo_uri)
-    db_collection = client[database]
-    leads_collection = db_collection["leads"]
+    # High-water mark of the last successfully loaded Modified_Time
+    if last_modified_time:
+        status["last_modified_time"] = last_modified_time
+    with timed_span("s3.put_object"):
+        get_s3_client().put_object(Bucket=s3_bucket_name, Key=status_key, Body=json.dumps(status))
+
+# Return the later of two Zoho Modified_Time values (ISO 8601, either may be None)
+def later_modified_time(first, second):
+    if not first or not second:
+        return first or second
+    return max(first, second, key=datetime.fromisoformat)
+
+# Build the If-Modified-Since value for a watermark
+def get_modified_since(last_modified_time):
+    # Step back one second so records sharing the watermark second but cut off
+    # by max_records last run are fetched again; the load is idempotent
+    modified_since = datetime.fromisoformat(last_modified_time) - timedelta(seconds=1)
+    return modified_since.isoformat()
+
+# Count Zoho leads with the count endpoint, walking id-only pages if it fails
+def get_zoho_record_count():
+    headers = get_zoho_headers()
+    response = zoho_get(zoho_count_url, headers, span_name="zoho.count")
+    if response.status_code == 200 and "count" in response.json():
+        return int(response.json()["count"])
+
+    print(f"Zoho count endpoint failed with status {response.status_code}, counting id-only pages.")
+    zoho_count, page = 0, 1
+    while True:
+        params = {"fields": "id", "per_page": zoho_per_page, "page": page}
+        response = zoho_get(zoho_base_url, headers, params, span_name="zoho.get_page")
+        if response.status_code == 204:
+            break
+        response.raise_for_status()
+        data = response.json()
+        zoho_count += len(data.get("data", []))
+        if not data.get("info", {}).get("more_records"):
+            break
+        page += 1
+    return zoho_count
 
-    # Count records in MongoDB
-    mongo_count = leads_collection.count_documents({})
+# Count MongoDB leads from collection metadata, or exactly when asked
+def count_mongo_leads(exact=False):
+    from pymongo.errors import OperationFailure
 
+    leads_collection = get_leads_collection()
+    if not exact:
+        try:
+            with timed_span("mongo.count"):
+                return leads_collection.estimated_document_count()
+        except OperationFailure as e:
+            print(f"Estimated count failed, falling back to an exact count: {e}")
+    with timed_span("mongo.count"):
+        return leads_collection.count_documents({})
+
+# Check if MongoDB count matches Zoho count and log
+def check_record_count():
     # Count records in Zoho CRM
-    access_token = get_access_token()
-    headers = {"Authorization": f"Zoho-oauthtoken {access_token}"}
-    response = requests.get(zoho_base_url, headers=headers, params={"fields": "id"})
-    zoho_count = len(response.json().get("data", []))
+    zoho_count = get_zoho_record_count()
+
+    # Count records in MongoDB, the metadata estimate is enough to decide the
+    # ETL must continue but a match is confirmed with an exact count
+    mongo_count, mongo_count_method = count_mongo_leads(), "estimated"
+    if mongo_count == zoho_count:
+        mongo_count, mongo_count_method = count_mongo_leads(exact=True), "exact"
 
     # Compare counts and log discrepancies if any
     log_entry = {
         "stage": "Record Count Comparison",
         "timestamp": str(datetime.now()),
         "mongo_count": mongo_count,
+        "mongo_count_method": mongo_count_method,
         "zoho_count": zoho_count,
         "status": "Match" if mongo_count == zoho_count else "Mismatch"
     }
@@ -211,7 +618,8 @@ def check_record_count():
     # If counts don't match, save discrepancies to S3 and return False
     if mongo_count != zoho_count:
         discrepancies = {"mongo_count": mongo_count, "zoho_count": zoho_count}
-        s3_client.put_object(Bucket=s3_bucket_name, Key=count_discrepancies_key, Body=json.dumps(discrepancies))
+        with timed_span("s3.put_object"):
+            get_s3_client().put_object(Bucket=s3_bucket_name, Key=count_discrepancies_key, Body=json.dumps(discrepancies))
         return False
 
     # If counts match, update status to prevent next run
@@ -234,106 +642,597 @@ def send_notification(message):
         logging.error(f"Failed to send notification: {e}")
 
 
-# Fetch Zoho leads
-def fetch_leads(max_records=10000):
-    access_token = get_access_token()
-    headers = {"Authorization": f"Zoho-oauthtoken {access_token}"}
-    leads, page, per_page = [], 1, 200
-    params = {"fields": "First_Name,Last_Name,Email,Phone,Company,Industry,Lead_Status", 
-              "per_page": per_page}
-
-    while len(leads) < max_records:
-        params["page"] = page
-        response = requests.get(zoho_base_url, headers=headers, params=params)
-        data = response.json()
-        if 'data' in data:
-            leads.extend(data['data'])
-            send_metrics_to_cloudwatch("RecordsProcessed", len(data["data"]))
-            page += 1
+# Fetch a single page of Zoho leads, returns None when the page has no data
+def fetch_leads_page(headers, page, stop_event):
+    # Another worker already hit the end of the data, skip the request
+    if stop_event.is_set():
+        return None
+
+    # Oldest changes first, so a run capped by max_records never skips records
+    params = {"fields": zoho_lead_fields, "per_page": zoho_per_page, "page": page,
+              "sort_by": "Modified_Time", "sort_order": "asc"}
+    response = zoho_get(zoho_base_url, headers, params, span_name="zoho.get_page")
+
+    # Zoho answers 204 No Content once the page is past the last record,
+    # and 304 Not Modified when nothing changed since If-Modified-Since
+    if response.status_code in (204, 304):
+        return None
+
+    # Any other error fails the run instead of passing for the end of the data
+    response.raise_for_status()
+    return response.json().get("data") or None
+
+# Fetch Zoho pages concurrently and yield them in page order
+def iter_lead_pages(headers, max_records, num_workers=None, start_page=1):
+    """
+    Fetches Zoho lead pages with a pool of worker threads.
+
+    At most `num_workers` pages are in flight at any time. Pages are yielded
+    strictly in page order, so the merged result is identical to a serial
+    walk. The first page that comes back without `data` (or short of a full
+    page) stops every worker, and no page beyond `max_records` is requested.
+    Shards start their walk at `start_page`. `num_workers` defaults to
+    num_fetch_workers as set when the walk starts.
+    """
+    num_workers = num_workers or num_fetch_workers
+    max_pages = start_page - 1 + -(-max_records // zoho_per_page)
+    stop_event = threading.Event()
+    futures = {}
+    next_page, current_page, fetched = start_page, start_page, 0
+
+    with ThreadPoolExecutor(max_workers=max(1, num_workers)) as executor:
+        try:
+            while current_page <= max_pages:
+                # Keep the pool busy with the next pages in line
+                while next_page <= max_pages and len(futures) < num_workers and not stop_event.is_set():
+                    futures[next_page] = executor.submit(fetch_leads_page, headers, next_page, stop_event)
+                    next_page += 1
+
+                page_data = futures.pop(current_page).result()
+                if not page_data:
+                    break
+
+                page_data = page_data[:max_records - fetched]
+                fetched += len(page_data)
+                yield page_data
+
+                # A short page is the last one, no need to wait for the others
+                if fetched >= max_records or len(page_data) < zoho_per_page:
+                    break
+                current_page += 1
+        finally:
+            # Stop workers that have not started and drop queued pages
+            stop_event.set()
+            for future in futures.values():
+                future.cancel()
+
+# Walk leads modified since a watermark one page at a time, by keyset
+def iter_modified_lead_pages(headers, max_records, last_modified_time):
+    """
+    Fetches the Zoho leads modified since `last_modified_time` with keyset
+    pagination.
+
+    Offset pages over a list sorted by Modified_Time shift when a lead is
+    edited mid-run: the edited lead moves to the end and the next unread
+    lead slides onto a page already read, while the watermark moves past
+    it. Instead every request asks for page 1 of the leads modified since
+    the last Modified_Time seen (stepped back one second), dropping leads
+    already yielded with the same Modified_Time. Only a full page within
+    one such window moves the walk on to the next page of the same query.
+    Pages are fetched one at a time, as each request depends on the last.
+    """
+    stop_event = threading.Event()
+    seen = {}  # (id, Modified_Time) of yielded leads -> their Modified_Time as a datetime
+    since, page, fetched = last_modified_time, 1, 0
+
+    while fetched < max_records:
+        headers["If-Modified-Since"] = get_modified_since(since)
+        page_data = fetch_leads_page(headers, page, stop_event)
+        if not page_data:
+            break
+
+        new_leads = [lead for lead in page_data if (lead["id"], lead.get("Modified_Time")) not in seen][:max_records - fetched]
+        for lead in new_leads:
+            if lead.get("Modified_Time"):
+                seen[(lead["id"], lead["Modified_Time"])] = datetime.fromisoformat(lead["Modified_Time"])
+        if new_leads:
+            fetched += len(new_leads)
+            yield new_leads
+        if len(page_data) < zoho_per_page:
+            break
 
-            # Stop if max_records is reached
-            if len(leads) >= max_records:
-                leads = leads[:max_records]
-                break
+        # Restart from the last Modified_Time of the page, or page on through a
+        # window of leads all modified within the same second
+        last_seen = page_data[-1].get("Modified_Time")
+        if last_seen and datetime.fromisoformat(last_seen) > datetime.fromisoformat(since):
+            since, page = last_seen, 1
+            window_start = datetime.fromisoformat(get_modified_since(since))
+            seen = {key: modified for key, modified in seen.items() if modified >= window_start}
         else:
+            page += 1
+
+# Backup writer: gzip-compressed NDJSON streamed to S3 as a multipart upload
+class S3GzipMultipartWriter:
+    """
+    Compresses leads into gzip NDJSON and uploads it to S3 in parts.
+
+    Parts of `part_size` bytes are uploaded by a small thread pool while
+    the caller keeps writing. At most `max_workers` parts are in flight, so
+    memory is bounded by roughly (max_workers + 1) * part_size.
+    """
+
+    def __init__(self, bucket, key, part_size=backup_part_size, max_workers=backup_upload_workers):
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.max_workers = max(1, max_workers)
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 writes a gzip container
+        self.buffer = bytearray()
+        self.parts = []
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self.upload_id = get_s3_client().create_multipart_upload(
+            Bucket=bucket, Key=key, ContentType="application/x-ndjson", ContentEncoding="gzip"
+        )["UploadId"]
+
+    def write_leads(self, leads):
+        for lead in leads:
+            self.buffer += self.compressor.compress((json.dumps(lead) + "\n").encode("utf-8"))
+        if len(self.buffer) >= self.part_size:
+            self._submit_part()
+
+    # A failed close leaves the upload open, callers abort it
+    def close(self):
+        self.buffer += self.compressor.flush()
+        self._submit_part()
+        parts = [future.result() for future in self.parts]
+        self.executor.shutdown()
+        with timed_span("s3.complete_multipart_upload"):
+            get_s3_client().complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                MultipartUpload={"Parts": parts}
+            )
+
+    def abort(self):
+        self.executor.shutdown(cancel_futures=True)
+        get_s3_client().abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+    def _submit_part(self):
+        # Wait for the oldest upload when the pool is saturated
+        in_flight = [future for future in self.parts if not future.done()]
+        if len(in_flight) >= self.max_workers:
+            in_flight[0].result()
+
+        part_number = len(self.parts) + 1
+        body, self.buffer = bytes(self.buffer), bytearray()
+        self.parts.append(self.executor.submit(self._upload_part, part_number, body))
+
+    def _upload_part(self, part_number, body):
+        with timed_span("s3.upload_part"):
+            response = get_s3_client().upload_part(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                PartNumber=part_number, Body=body
+            )
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+# Columnar snapshot: one Parquet row group per Zoho page batch, written and
+# read through pyarrow's S3 filesystem
+@functools.lru_cache(maxsize=None)
+def get_snapshot_filesystem():
+    import pyarrow.fs
+
+    return pyarrow.fs.S3FileSystem(region=region_name)
+
+@functools.lru_cache(maxsize=None)
+def get_snapshot_schema():
+    import pyarrow
+
+    return pyarrow.schema([(field, pyarrow.string()) for field in ["id"] + zoho_lead_fields.split(",")])
+
+class S3ParquetWriter:
+    """
+    Writes leads to S3 as a Parquet snapshot, with the same interface as
+    S3GzipMultipartWriter.
+
+    Every write_leads call becomes one row group. Readers fetch only the
+    column chunks they ask for, so validation never downloads the columns
+    it does not compare.
+    """
+
+    def __init__(self, bucket, key):
+        import pyarrow.parquet
+
+        self.path = f"{bucket}/{key}"
+        self.schema = get_snapshot_schema()
+        self.stream = get_snapshot_filesystem().open_output_stream(self.path)
+        self.writer = pyarrow.parquet.ParquetWriter(self.stream, self.schema, compression="zstd")
+
+    def write_leads(self, leads):
+        import pyarrow
+
+        if leads:
+            with timed_span("s3.snapshot_write"):
+                self.writer.write_table(pyarrow.Table.from_pylist(leads, schema=self.schema))
+
+    def close(self):
+        with timed_span("s3.snapshot_write"):
+            self.writer.close()
+            self.stream.close()
+
+    def abort(self):
+        # The output stream cannot drop its upload, delete the partial snapshot instead
+        try:
+            self.writer.close()
+            self.stream.close()
+        finally:
+            get_snapshot_filesystem().delete_file(self.path)
+
+def open_backup_writer(bucket, key):
+    if key.endswith(".parquet"):
+        return S3ParquetWriter(bucket, key)
+    return S3GzipMultipartWriter(bucket, key)
+
+# Bulk Read backend: one asynchronous export job per 200,000 leads, whose
+# result is a zipped CSV instead of pages of 200 records
+def create_bulk_read_job(headers, page=1):
+    body = {"query": {"module": "Leads", "fields": zoho_lead_fields.split(","), "page": page}}
+    response = zoho_request("POST", zoho_bulk_read_url, headers, span_name="zoho.bulk_read_create", json=body)
+    response.raise_for_status()
+    return response.json()["data"][0]["details"]["id"]
+
+def wait_for_bulk_read_job(headers, job_id):
+    deadline = time.monotonic() + bulk_read_timeout
+    while True:
+        response = zoho_get(f"{zoho_bulk_read_url}/{job_id}", headers, span_name="zoho.bulk_read_poll")
+        response.raise_for_status()
+        job = response.json()["data"][0]
+        if job["state"] == "COMPLETED":
+            return job["result"]
+        if job["state"] not in ("ADDED", "QUEUED", "IN PROGRESS"):
+            raise Exception(f"Bulk Read job {job_id} ended in state {job['state']}")
+        if time.monotonic() > deadline:
+            raise Exception(f"Bulk Read job {job_id} did not complete within {bulk_read_timeout} seconds")
+        time.sleep(bulk_read_poll_interval)
+
+# Download a job result to /tmp and stream its CSV rows as leads shaped like
+# the REST API returns them: "Id" becomes "id" and empty cells become None
+def iter_bulk_read_result(headers, job_id):
+    response = zoho_request(
+        "GET", f"{zoho_bulk_read_url}/{job_id}/result", headers, span_name="zoho.bulk_read_download", stream=True
+    )
+    response.raise_for_status()
+    with timed_span("zoho.bulk_read_transfer"):
+        with open(bulk_read_download_path, "wb") as download:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                download.write(chunk)
+
+    try:
+        with zipfile.ZipFile(bulk_read_download_path) as archive:
+            csv_name = next(name for name in archive.namelist() if name.endswith(".csv"))
+            with archive.open(csv_name) as csv_file:
+                for row in csv.DictReader(io.TextIOWrapper(csv_file, encoding="utf-8-sig", newline="")):
+                    yield {("id" if field == "Id" else field): (value or None) for field, value in row.items()}
+    finally:
+        os.remove(bulk_read_download_path)
+
+def iter_bulk_read_batches(headers):
+    """
+    Exports every Zoho lead through Bulk Read jobs and yields them in
+    batches of `bulk_read_batch_size`.
+
+    Bulk Read results are not sorted by Modified_Time, so the export is
+    never cut short at max_records: a partial export could move the
+    watermark past leads it did not read.
+    """
+    page = 1
+    while True:
+        job_id = create_bulk_read_job(headers, page)
+        print(f"Bulk Read job {job_id} created for page {page}, waiting for it to complete...")
+        result = wait_for_bulk_read_job(headers, job_id)
+        yield from iter_lead_chunks(iter_bulk_read_result(headers, job_id), bulk_read_batch_size)
+        if not result.get("more_records"):
             break
+        page += 1
+
+# Choose the extraction backend: Bulk Read for full extractions that are
+# large enough to pay for the job round trips and fit within max_records
+def choose_extract_backend(max_records, last_modified_time=None):
+    if not bulk_read_threshold or last_modified_time or max_records <= bulk_read_threshold:
+        return "rest"
+    zoho_count = get_zoho_record_count()
+    return "bulk" if bulk_read_threshold < zoho_count <= max_records else "rest"
+
+# Stream Zoho leads page by page, writing the S3 backup as batches go by
+def stream_leads(max_records=10000, last_modified_time=None, start_page=1, backup_key=s3_key_backup_leads, backend=None):
+    """
+    Yields Zoho leads in page batches instead of one list.
+
+    Each batch is written to the backup (gzip NDJSON, or a Parquet row
+    group with SNAPSHOT_FORMAT=parquet) before it is handed to the caller,
+    so memory stays bounded by the batch size plus the backup parts in
+    flight.
+
+    With `last_modified_time` only leads modified since that watermark are
+    requested, through Zoho's If-Modified-Since header, and walked by keyset
+    (iter_modified_lead_pages) so none are skipped by edits made mid-run.
+
+    `backend` is "rest" for the paginated Leads API or "bulk" for Bulk Read
+    jobs. By default choose_extract_backend picks one, and walks that start
+    past the first page always use the Leads API.
+    """
+    headers = get_zoho_headers()
+    if last_modified_time:
+        headers["If-Modified-Since"] = get_modified_since(last_modified_time)
+    if backend is None:
+        backend = choose_extract_backend(max_records, last_modified_time) if start_page == 1 else "rest"
+    record_count = 0
+
+    if backend == "bulk":
+        print("Extracting leads with the Zoho Bulk Read API...")
+        batches = iter_bulk_read_batches(headers)
+    elif last_modified_time and start_page == 1:
+        batches = iter_modified_lead_pages(headers, max_records, last_modified_time)
+    else:
+        batches = iter_lead_pages(headers, max_records, start_page=start_page)
+
+    # Save leads to S3 while pages stream in. A failed write or close aborts
+    # the upload, an open multipart upload keeps its parts and their storage cost
+    backup_writer = open_backup_writer(s3_bucket_name, backup_key)
+    try:
+        for page_data in batches:
+            backup_writer.write_leads(page_data)
+            record_count += len(page_data)
+            send_metrics_to_cloudwatch("RecordsProcessed", len(page_data))
+            yield page_data
+        backup_writer.close()
+    except BaseException:
+        backup_writer.abort()
+        raise
 
-    # Save leads to S3
-    s3_client.put_object(Bucket=s3_bucket_name, Key=s3_key_backup_leads, Body=json.dumps(leads))
     save_log_to_s3({
         "stage": "Extraction", 
         "timestamp": str(datetime.now()), 
-        "record_count": len(leads), 
+        "record_count": record_count, 
+        "backend": backend,
         "status": "Data fetched"})
-    
+
+# Fetch Zoho leads
+def fetch_leads(max_records=10000, last_modified_time=None, backend=None):
+    leads = []
+    for page_data in stream_leads(max_records, last_modified_time, backend=backend):
+        leads.extend(page_data)
     return leads
 
 # Get MongoDB credentials from Secrets Manager
 def get_mongo_credentials():
     secret_name = "zohocrmmig"
     # region_name = "ap-southeast-2"
-    response = secrets_client.get_secret_value(SecretId=secret_name)
+    response = get_secrets_client().get_secret_value(SecretId=secret_name)
     secret = json.loads(response['SecretString'])
     return secret['username'], secret['password'], secret['host'], secret['port']
 
-# Connect to MongoDB and get the leads collection
-def get_leads_collection():
-    # Get MongoDB credentials
-    username, password, host, port = get_mongo_credentials()
-    database = "zoho_crm"
+# MongoDB client and collection bootstrap state, kept for the life of the container
+mongo_client = None
+leads_collection_ready = False
+mongo_lock = threading.Lock()
+
+# Connect to MongoDB once per container and reuse the connection pool
+def get_mongo_client():
+    global mongo_client
+    with mongo_lock:
+        if mongo_client is None:
+            # Get MongoDB credentials
+            username, password, host, port = get_mongo_credentials()
 
-    # Construct the MongoDB URI with TLS settings
-    mongo_uri = f"mongodb://{username}:{password}@{host}:{port}/{database}?tls=true&retryWrites=false&tlsCAFile={ca_ec2_bundle_path}"
-    client = pymongo.MongoClient(mongo_uri)
+            # Construct the MongoDB URI with TLS settings
+            mongo_uri = f"mongodb://{username}:{password}@{host}:{port}/{mongo_database}?tls=true&retryWrites=false&tlsCAFile={ca_ec2_bundle_path}"
+            import pymongo
+
+            mongo_client = pymongo.MongoClient(mongo_uri, maxPoolSize=mongo_max_pool_size)
+    return mongo_client
+
+# Get the leads collection, creating it and its indexes on first use
+def get_leads_collection():
+    global leads_collection_ready
 
     # Access the database and the 'leads' collection
-    db = client[database]
+    db = get_mongo_client()[mongo_database]
     collection_name = "leads"
-    
-    # Check if the 'leads' collection exists; if not, create it
-    if collection_name not in db.list_collection_names():
-        print(f"Creating collection '{collection_name}' in MongoDB.")
-        db.create_collection(collection_name)
-    else:
-        print(f"Collection '{collection_name}' already exists in MongoDB.")
+
+    with mongo_lock:
+        if not leads_collection_ready:
+            # Check if the 'leads' collection exists; if not, create it
+            if collection_name not in db.list_collection_names():
+                print(f"Creating collection '{collection_name}' in MongoDB.")
+                db.create_collection(collection_name)
+            else:
+                print(f"Collection '{collection_name}' already exists in MongoDB.")
+            ensure_leads_indexes(db[collection_name])
+            leads_collection_ready = True
 
     # Return the collection object
     return db[collection_name]
 
-# Retrieve leads from MongoDB
-def get_mongo_leads():
+# Content digest of a lead over its canonical field set, stored as _digest at load time
+def calculate_lead_digest(lead):
+    import hashlib
+
+    canonical = {field: lead.get(field) for field in lead_digest_fields}
+    return hashlib.md5(json.dumps(canonical, sort_keys=True).encode('utf-8')).hexdigest()
+
+# Hash fields stored with each lead: content digest, 32-bit id hash for
+# reconciliation buckets and a 32-bit checksum that buckets sum up
+def calculate_lead_hashes(lead):
+    import hashlib
+
+    digest = calculate_lead_digest(lead)
+    id_hash = int(hashlib.md5(str(lead.get("id")).encode('utf-8')).hexdigest()[:8], 16)
+    return {"_digest": digest, "_id_hash": id_hash, "_checksum": int(digest[:8], 16)}
+
+# 64-bit hash of a lead key (Zoho id or email) for LeadIndex
+def hash_lead_key(key):
+    import hashlib
+
+    return int.from_bytes(hashlib.md5(str(key).encode('utf-8')).digest()[:8], "big")
+
+# Compact index of the leads in MongoDB
+class LeadIndex:
+    """
+    Answers "already loaded?" and "changed?" without holding the leads.
+
+    Keys are hashed to 64 bits and kept sorted in an array('Q'), with the
+    first 64 bits of each lead's hex digest at the same position in a
+    parallel array, so a lead costs 16 bytes instead of a dict of its
+    fields. Lookups are binary searches. A lead stored without a digest is
+    indexed with 0 and always counts as changed.
+
+    Parameters:
+    - entries (iterable): (key, hex digest or None) pairs.
+    """
+
+    __slots__ = ("key_hashes", "digests")
+
+    def __init__(self, entries=()):
+        key_hashes, digests = array('Q'), array('Q')
+        for key, digest in entries:
+            key_hashes.append(hash_lead_key(key))
+            digests.append(int(digest[:16], 16) if digest else 0)
+
+        order = sorted(range(len(key_hashes)), key=key_hashes.__getitem__)
+        self.key_hashes = array('Q', (key_hashes[position] for position in order))
+        self.digests = array('Q', (digests[position] for position in order))
+
+    def __len__(self):
+        return len(self.key_hashes)
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def is_changed(self, key, digest):
+        position = self._find(key)
+        return position is None or self.digests[position] != int(digest[:16], 16)
+
+    def _find(self, key):
+        key_hash = hash_lead_key(key)
+        position = bisect.bisect_left(self.key_hashes, key_hash)
+        if position < len(self.key_hashes) and self.key_hashes[position] == key_hash:
+            return position
+        return None
+
+# Split an iterable of leads into lists of chunk_size leads
+def iter_lead_chunks(leads, chunk_size):
+    chunk = []
+    for lead in leads:
+        chunk.append(lead)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# Read back the stored leads for a batch of Zoho ids, keyed by id. Chunked
+# $in queries on the unique id index, projected to the fields the caller compares
+def find_mongo_leads_by_id(leads_collection, lead_ids, fields):
+    projection = {"_id": 0, "id": 1, **{field: 1 for field in fields}}
+    mongo_leads = {}
+    for start in range(0, len(lead_ids), lookup_chunk_size):
+        chunk = lead_ids[start:start + lookup_chunk_size]
+        with timed_span("mongo.find"):
+            cursor = leads_collection.find({"id": {"$in": chunk}}, projection, batch_size=lookup_cursor_batch_size)
+            mongo_leads.update((lead["id"], lead) for lead in cursor)
+    return mongo_leads
+
+# Index the stored digest of every lead in MongoDB by Zoho id, reading only
+# those two fields
+def get_mongo_lead_index():
     leads_collection = get_leads_collection()
-    leads = list(leads_collection.find({}, {"_id": 0}))
-    return {lead["Email"]: lead for lead in leads}
+    with timed_span("mongo.find"):
+        cursor = leads_collection.find({}, {"_id": 0, "id": 1, "_digest": 1}, batch_size=10000)
+        return LeadIndex((lead["id"], lead.get("_digest")) for lead in cursor if "id" in lead)
+
+# Load the extraction backup of a run from S3. Parquet snapshots can be read
+# for a subset of columns, the JSON formats always return whole leads
+def iter_backup_leads(backup_key=s3_key_backup_leads, columns=None):
+    if backup_key.endswith(".parquet"):
+        import pyarrow.parquet
+
+        with get_snapshot_filesystem().open_input_file(f"{s3_bucket_name}/{backup_key}") as snapshot_file:
+            batches = pyarrow.parquet.ParquetFile(snapshot_file).iter_batches(columns=columns)
+            while True:
+                # Time the reads only, not the caller's work while the generator is paused
+                with timed_span("s3.snapshot_read"):
+                    batch = next(batches, None)
+                if batch is None:
+                    return
+                yield from batch.to_pylist()
+
+    with timed_span("s3.get_object"):
+        response = get_s3_client().get_object(Bucket=s3_bucket_name, Key=backup_key)
+
+    # Older backups are a single JSON array
+    if not backup_key.endswith(".ndjson.gz"):
+        yield from json.loads(response['Body'].read())
+        return
+
+    with gzip.GzipFile(fileobj=response['Body']) as backup_file:
+        for line in backup_file:
+            if line.strip():
+                yield json.loads(line)
 
 # Validate Zoho data against MongoDB
-def validate_data():
-    mongo_leads = get_mongo_leads()
-    zoho_leads = fetch_leads(num_fetch_data)  # Fetch fresh data from Zoho
+def validate_data(zoho_leads=None, backup_key=s3_key_backup_leads):
+    """
+    Validates the leads extracted by this run against MongoDB.
+
+    Leads are checked in chunks of `lookup_chunk_size`. Each chunk reads
+    back only its own ids, projected to {id, _digest}, so the cost follows
+    the number of leads validated, not the collection size. The compared
+    fields are read in a second lookup, only for the leads whose digests
+    differ.
+
+    Parameters:
+    - zoho_leads (iterable): The in-memory snapshot from the extraction stage.
+    - backup_key (str): S3 backup to validate when no snapshot is passed,
+      which allows re-validation without any Zoho API calls.
+    """
+    if zoho_leads is None:
+        zoho_leads = iter_backup_leads(backup_key, snapshot_read_columns)
+    leads_collection = get_leads_collection()
 
     discrepancies = []
     required_fields = ["Last_Name", "First_Name", "Email", "Phone"]
 
-    for zoho_lead in zoho_leads:
-        email = zoho_lead.get("Email")
-        mongo_lead = mongo_leads.get(email)
-        
-        if not mongo_lead:
-            discrepancies.append({"Email": email, "error": "Missing in MongoDB"})
+    for zoho_chunk in iter_lead_chunks(zoho_leads, lookup_chunk_size):
+        lead_ids = [zoho_lead["id"] for zoho_lead in zoho_chunk if zoho_lead.get("id")]
+        mongo_digests = find_mongo_leads_by_id(leads_collection, lead_ids, ["_digest"])
+
+        # Only leads whose digests differ need a field-by-field comparison
+        changed_leads = []
+        for zoho_lead in zoho_chunk:
+            mongo_lead = mongo_digests.get(zoho_lead.get("id"))
+            if mongo_lead is None:
+                discrepancies.append({"id": zoho_lead.get("id"), "Email": zoho_lead.get("Email"), "error": "Missing in MongoDB"})
+            elif mongo_lead.get("_digest") != calculate_lead_digest(zoho_lead):
+                changed_leads.append(zoho_lead)
+        if not changed_leads:
             continue
 
-        for field in required_fields:
-            if mongo_lead.get(field) != zoho_lead.get(field):
-                discrepancies.append({
-                    "Email": email,
-                    "field": field,
-                    "zoho_value": zoho_lead.get(field),
-                    "mongo_value": mongo_lead.get(field)
-                })
+        mongo_leads = find_mongo_leads_by_id(leads_collection, [zoho_lead["id"] for zoho_lead in changed_leads], required_fields)
+        for zoho_lead in changed_leads:
+            mongo_lead = mongo_leads.get(zoho_lead["id"], {})
+            for field in required_fields:
+                if mongo_lead.get(field) != zoho_lead.get(field):
+                    discrepancies.append({
+                        "id": zoho_lead["id"],
+                        "Email": zoho_lead.get("Email"),
+                        "field": field,
+                        "zoho_value": zoho_lead.get(field),
+                        "mongo_value": mongo_lead.get(field)
+                    })
 
     # Save discrepancies to S3
     if discrepancies:
-        s3_client.put_object(Bucket=s3_bucket_name, Key=data_discrepancies_key, Body=json.dumps(discrepancies))
+        with timed_span("s3.put_object"):
+            get_s3_client().put_object(Bucket=s3_bucket_name, Key=data_discrepancies_key, Body=json.dumps(discrepancies))
         log_entry = {
             "stage": "Validation",
             "timestamp": str(datetime.now()),
@@ -350,163 +1249,432 @@ def validate_data():
         save_log_to_s3(log_entry)
 
 
-# """
-# use below 3 functions only if the etl job can load all the records in one go
-# """
-# def calculate_md5(data):
-#     """Helper function to calculate MD5 checksum of a JSON-like data structure."""
-#     md5 = hashlib.md5()
-#     md5.update(json.dumps(data, sort_keys=True).encode('utf-8'))
-#     return md5.hexdigest()
+# Reconcile the whole collection against a Zoho snapshot with per-bucket checksums.
+# One pass over the snapshot, which also keeps each lead's numeric Zoho id and the
+# first 64 bits of its digest in two array('Q') per bucket, 16 bytes a lead, for
+# the drill-down instead of the leads themselves
+def get_zoho_bucket_checksums(zoho_leads, num_buckets):
+    buckets = {}
+    for zoho_lead in zoho_leads:
+        hashes = calculate_lead_hashes(zoho_lead)
+        bucket = buckets.get(hashes["_id_hash"] % num_buckets)
+        if bucket is None:
+            bucket = buckets[hashes["_id_hash"] % num_buckets] = {
+                "count": 0, "checksum": 0, "ids": array('Q'), "digests": array('Q')
+            }
+        bucket["count"] += 1
+        bucket["checksum"] += hashes["_checksum"]
+        bucket["ids"].append(int(zoho_lead["id"]))
+        bucket["digests"].append(int(hashes["_digest"][:16], 16))
+    return buckets
+
+def get_mongo_bucket_checksums(leads_collection, num_buckets):
+    # Checksums are summed on the DB side, only one small row per bucket comes back
+    pipeline = [
+        {"$match": {"_id_hash": {"$exists": True}}},
+        {"$group": {
+            "_id": {"$mod": ["$_id_hash", num_buckets]},
+            "count": {"$sum": 1},
+            "checksum": {"$sum": "$_checksum"}
+        }}
+    ]
+    with timed_span("mongo.aggregate"):
+        return {
+            int(row["_id"]): {"count": row["count"], "checksum": row["checksum"]}
+            for row in leads_collection.aggregate(pipeline)
+        }
+
+def reconcile_data(zoho_leads=None, backup_key=s3_key_backup_leads, num_buckets=reconcile_num_buckets):
+    """
+    Localizes drift between a full Zoho snapshot and the leads collection.
 
-# def load_backup_data_from_s3():
-#     """Load the backup JSON data file from S3."""
-#     response = s3_client.get_object(Bucket=s3_bucket_name, Key=s3_key_backup_leads)
-#     return json.loads(response['Body'].read())
+    Records are partitioned into `num_buckets` buckets by a hash of their
+    Zoho id, and each side computes a (count, checksum) pair per bucket.
+    Only the buckets whose pairs differ are read back from MongoDB, as
+    {id, _digest} projections, to list the exact missing, extra and changed
+    leads.
 
-# def validate_data():
-#     # Load backup data from S3
-#     try:
-#         zoho_backup_data = load_backup_data_from_s3()
-#         zoho_data_count = len(zoho_backup_data)
-#         zoho_data_md5 = calculate_md5(zoho_backup_data)
-#     except Exception as e:
-#         log_entry = {
-#             "stage": "Validation",
-#             "timestamp": str(datetime.now()),
-#             "status": f"Failed to load backup data from S3: {e}"
-#         }
-#         save_log_to_s3(log_entry)
-#         return
-
-#     # Load data from MongoDB
-#     mongo_leads = get_mongo_leads()
-#     mongo_data_count = len(mongo_leads)
-#     mongo_data_md5 = calculate_md5(mongo_leads)
-
-#     # Compare record counts
-#     if zoho_data_count != mongo_data_count:
-#         log_entry = {
-#             "stage": "Validation",
-#             "timestamp": str(datetime.now()),
-#             "status": "Record count mismatch",
-#             "zoho_count": zoho_data_count,
-#             "mongo_count": mongo_data_count
-#         }
-#         save_log_to_s3(log_entry)
-
-#     # Compare checksums for data integrity
-#     elif zoho_data_md5 != mongo_data_md5:
-#         log_entry = {
-#             "stage": "Validation",
-#             "timestamp": str(datetime.now()),
-#             "status": "Data integrity mismatch",
-#             "zoho_md5": zoho_data_md5,
-#             "mongo_md5": mongo_data_md5
-#         }
-#         save_log_to_s3(log_entry)
-
-#     else:
-#         # Field-level validation
-#         discrepancies = []
-#         required_fields = ["Last_Name", "First_Name", "Email", "Phone"]
-
-#         for zoho_lead in zoho_backup_data:
-#             email = zoho_lead.get("Email")
-#             mongo_lead = mongo_leads.get(email)
-            
-#             if not mongo_lead:
-#                 discrepancies.append({"Email": email, "error": "Missing in MongoDB"})
-#                 continue
-
-#             for field in required_fields:
-#                 if mongo_lead.get(field) != zoho_lead.get(field):
-#                     discrepancies.append({
-#                         "Email": email,
-#                         "field": field,
-#                         "zoho_value": zoho_lead.get(field),
-#                         "mongo_value": mongo_lead.get(field)
-#                     })
-
-#         # Save discrepancies to S3 if any are found
-#         if discrepancies:
-#             s3_client.put_object(Bucket=s3_bucket_name, Key=data_discrepancies_key, Body=json.dumps(discrepancies))
-#             log_entry = {
-#                 "stage": "Validation",
-#                 "timestamp": str(datetime.now()),
-#                 "status": "Discrepancies found",
-#                 "discrepancies": discrepancies
-#             }
-#             save_log_to_s3(log_entry)
-#         else:
-#             log_entry = {
-#                 "stage": "Validation",
-#                 "timestamp": str(datetime.now()),
-#                 "status": "Validation successful, no discrepancies found"
-#             }
-#             save_log_to_s3(log_entry)
-# """
-# use above 3 functions only if the etl job can load all the records in one go
-# """
+    `zoho_leads` may be any iterable and is walked once, as is the S3
+    backup read when it is None. Only 16 bytes per lead are kept for the
+    drill-down, never the leads themselves.
+    """
+    if zoho_leads is None:
+        zoho_leads = iter_backup_leads(backup_key, snapshot_read_columns)
+    leads_collection = get_leads_collection()
+
+    zoho_buckets = get_zoho_bucket_checksums(zoho_leads, num_buckets)
+    mongo_buckets = get_mongo_bucket_checksums(leads_collection, num_buckets)
+    empty_bucket = {"count": 0, "checksum": 0}
+    mismatched_buckets = sorted(
+        bucket for bucket in set(zoho_buckets) | set(mongo_buckets)
+        if any(zoho_buckets.get(bucket, empty_bucket)[key] != mongo_buckets.get(bucket, empty_bucket)[key]
+               for key in ("count", "checksum"))
+    )
+
+    # Drill into the mismatching buckets only
+    drift = {"missing_in_mongo": [], "extra_in_mongo": [], "changed": []}
+    if mismatched_buckets:
+        zoho_digests = {}
+        for bucket in mismatched_buckets:
+            if bucket in zoho_buckets:
+                zoho_digests.update(zip(zoho_buckets[bucket]["ids"], zoho_buckets[bucket]["digests"]))
+        pipeline = [
+            {"$match": {"_id_hash": {"$exists": True}}},
+            {"$project": {"_id": 0, "id": 1, "_digest": 1, "bucket": {"$mod": ["$_id_hash", num_buckets]}}},
+            {"$match": {"bucket": {"$in": mismatched_buckets}}}
+        ]
+        with timed_span("mongo.aggregate"):
+            mongo_digests = {
+                int(lead["id"]): int(lead["_digest"][:16], 16) if lead.get("_digest") else 0
+                for lead in leads_collection.aggregate(pipeline)
+            }
+        drift["missing_in_mongo"] = [str(lead_id) for lead_id in sorted(set(zoho_digests) - set(mongo_digests))]
+        drift["extra_in_mongo"] = [str(lead_id) for lead_id in sorted(set(mongo_digests) - set(zoho_digests))]
+        drift["changed"] = [
+            str(lead_id) for lead_id in sorted(set(zoho_digests) & set(mongo_digests))
+            if zoho_digests[lead_id] != mongo_digests[lead_id]
+        ]
+
+    # Leads loaded before the hash fields existed cannot be bucketed
+    with timed_span("mongo.count"):
+        unhashed_count = leads_collection.count_documents({"_id_hash": {"$exists": False}})
+
+    log_entry = {
+        "stage": "Reconciliation",
+        "timestamp": str(datetime.now()),
+        "status": "Drift found" if mismatched_buckets or unhashed_count else "No drift found",
+        "num_buckets": num_buckets,
+        "mismatched_buckets": len(mismatched_buckets),
+        "unhashed_mongo_leads": unhashed_count,
+        **{key: len(ids) for key, ids in drift.items()}
+    }
+    if mismatched_buckets:
+        with timed_span("s3.put_object"):
+            get_s3_client().put_object(Bucket=s3_bucket_name, Key=reconciliation_key, Body=json.dumps(drift))
+    save_log_to_s3(log_entry)
+    return drift
 
 
 
-# Incremental load new data into MongoDB
-def incremental_load(leads):
-    existing_emails = get_mongo_leads().keys()
-    new_leads = [lead for lead in leads if lead.get("Email") not in existing_emails]
 
+# Unique index on the Zoho record id, created with the collection bootstrap
+def ensure_leads_indexes(leads_collection):
+    from pymongo.errors import OperationFailure
+
+    try:
+        leads_collection.create_index("id", unique=True)
+    except OperationFailure as e:
+        # Most likely duplicate ids left by the old insert_many loads
+        log_error(f"Failed to create unique index on leads.id: {e}")
+
+# Upsert a batch of leads keyed on the Zoho record id
+def upsert_leads(leads_collection, leads):
+    from pymongo import UpdateOne
+
+    operations = [
+        UpdateOne({"id": lead["id"]}, {"$set": {**lead, **calculate_lead_hashes(lead)}}, upsert=True)
+        for lead in leads if lead.get("id")
+    ]
+    if len(operations) < len(leads):
+        log_error(f"Skipped {len(leads) - len(operations)} leads without a Zoho id")
+
+    upserted_count, modified_count = 0, 0
+    for start in range(0, len(operations), upsert_batch_size):
+        with timed_span("mongo.bulk_write"):
+            result = leads_collection.bulk_write(operations[start:start + upsert_batch_size], ordered=False)
+        upserted_count += result.upserted_count
+        modified_count += result.modified_count
+    return upserted_count, modified_count
+
+# Incremental load new data into MongoDB, one batch of leads at a time
+# Returns the load counts and the latest Modified_Time among the loaded leads.
+# Leads whose digest is unchanged are not written: their stored digests come
+# from the LeadIndex of the collection when given, otherwise from one $in
+# lookup of the batch's ids
+def incremental_load_batches(batches, lead_index=None):
     leads_collection = get_leads_collection()
-    if new_leads:
-        leads_collection.insert_many(new_leads)
+    record_count, inserted_count, updated_count, unchanged_count = 0, 0, 0, 0
+    last_modified_time = None
+
+    for leads in batches:
+        record_count += len(leads)
+        for lead in leads:
+            last_modified_time = later_modified_time(last_modified_time, lead.get("Modified_Time"))
+        if lead_index is not None:
+            changed_leads = [lead for lead in leads if lead_index.is_changed(lead.get("id"), calculate_lead_digest(lead))]
+        else:
+            lead_ids = [lead["id"] for lead in leads if lead.get("id")]
+            stored_leads = find_mongo_leads_by_id(leads_collection, lead_ids, ["_digest"])
+            changed_leads = [
+                lead for lead in leads
+                if stored_leads.get(lead.get("id"), {}).get("_digest") != calculate_lead_digest(lead)
+            ]
+        unchanged_count += len(leads) - len(changed_leads)
+        leads = changed_leads
+        upserted, modified = upsert_leads(leads_collection, leads)
+        inserted_count += upserted
+        updated_count += modified
+
+    if inserted_count or updated_count:
         log_entry = {
             "stage": "Incremental Load",
             "timestamp": str(datetime.now()),
-            "status": f"Inserted {len(new_leads)} new leads into DocumentDB"
+            "status": f"Inserted {inserted_count} new leads and updated {updated_count} leads in DocumentDB",
+            "unchanged_count": unchanged_count
         }
     else:
         log_entry = {
             "stage": "Incremental Load",
             "timestamp": str(datetime.now()),
-            "status": "No new leads to insert"
+            "status": "No new or changed leads to load",
+            "unchanged_count": unchanged_count
         }
     save_log_to_s3(log_entry)
+    return {
+        "record_count": record_count,
+        "inserted_count": inserted_count,
+        "updated_count": updated_count,
+        "unchanged_count": unchanged_count,
+        "last_modified_time": last_modified_time
+    }
+
+# Incremental load new data into MongoDB
+def incremental_load(leads, lead_index=None):
+    return incremental_load_batches([leads], lead_index)
+
+# Fan-out extraction: a coordinator splits the Zoho page space into shards and
+# each worker extracts and loads one shard
+def plan_shards(total_records, num_workers, modified_since=None, run_id=None):
+    total_pages = max(1, -(-total_records // zoho_per_page))
+    num_workers = max(1, min(num_workers, total_pages))
+    pages_per_shard, extra_pages = divmod(total_pages, num_workers)
+
+    shards, start_page = [], 1
+    for shard_id in range(num_workers):
+        num_pages = pages_per_shard + (1 if shard_id < extra_pages else 0)
+        shards.append({
+            "shard_id": shard_id,
+            "start_page": start_page,
+            "num_pages": num_pages,
+            "modified_since": modified_since,
+            "run_id": f"{run_id or run_log['run_id']}_shard{shard_id:03d}"
+        })
+        start_page += num_pages
+    return shards
+
+def run_shard(shard):
+    backup_key = s3_key_backup_leads.replace(backup_key_suffix, f"_shard{shard['shard_id']:03d}{backup_key_suffix}")
+    batches = stream_leads(
+        shard["num_pages"] * zoho_per_page, shard.get("modified_since"),
+        start_page=shard["start_page"], backup_key=backup_key, backend="rest"
+    )
+    return {"shard_id": shard["shard_id"], "backup_key": backup_key, **incremental_load_batches(batches)}
+
+# Called in every local fan-out worker after reset_local_worker, e.g. to point
+# it at local stand-ins; must be picklable when processes are spawned
+local_worker_initializer = None
+
+def reset_local_worker(initializer=None):
+    # Forked workers must not reuse the parent's sockets, clients or buffered metrics
+    global mongo_client, leads_collection_ready
+    mongo_client, leads_collection_ready = None, False
+    for getter in (get_s3_client, get_cloudwatch_client, get_secrets_client, get_zoho_session, get_snapshot_filesystem):
+        # Getters replaced by stand-ins have no cache
+        if hasattr(getter, "cache_clear"):
+            getter.cache_clear()
+    with metrics_lock:
+        metrics_buffer.clear()
+    start_run_timings()
+
+    if initializer:
+        initializer()
+
+def run_local_shard(shard):
+    # Pool processes exit without running atexit hooks, flush here
+    start_run_log(shard["run_id"])
+    start_run_timings()
+    try:
+        return run_shard(shard)
+    finally:
+        try:
+            report_run_timings()
+            flush_metrics()
+        finally:
+            flush_run_log()
+
+# One Lambda client shared by every dispatch thread, boto3 clients are thread-safe
+# once created but creating them from several threads at once is not
+def create_worker_lambda_client(num_shards):
+    from botocore.config import Config
+
+    # Workers can run for minutes, and a retried invoke would load the shard twice
+    return boto3.client(
+        'lambda', region_name=region_name,
+        config=Config(read_timeout=900, retries={"max_attempts": 0}, max_pool_connections=max(10, num_shards))
+    )
+
+def invoke_worker_lambda(lambda_client, shard):
+    response = lambda_client.invoke(
+        FunctionName=fanout_function_name,
+        InvocationType="RequestResponse",
+        Payload=json.dumps({"mode": "worker", "shard": shard})
+    )
+    payload = json.loads(response["Payload"].read() or "null")
+    if response.get("FunctionError"):
+        raise Exception(f"Shard {shard['shard_id']} failed: {payload}")
+    return payload
+
+def run_coordinator(event, modified_since=None):
+    """
+    Splits the extraction into page-range shards and runs them on N workers.
+
+    Workers are separate Lambda invocations of this function (FANOUT_DISPATCH
+    "lambda") or a local process pool ("local", for testing), whose workers
+    run local_worker_initializer after resetting their clients. Per-shard
+    results are merged into one summary with the same keys as
+    incremental_load_batches returns, plus the shard results themselves.
+    A run with a watermark is walked by keyset, which cannot be split by
+    page, so it runs as a single shard.
+    """
+    num_workers = 1 if modified_since else int(event.get("num_workers", fanout_num_workers))
+    dispatch = event.get("dispatch", fanout_dispatch)
+    total_records = int(event.get("max_records") or get_zoho_record_count())
+    shards = plan_shards(total_records, num_workers, modified_since)
+    print(f"Dispatching {len(shards)} shards covering {total_records} records to {dispatch} workers...")
+
+    if dispatch == "local":
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(
+            max_workers=len(shards), initializer=reset_local_worker, initargs=(local_worker_initializer,)
+        ) as executor:
+            shard_results = list(executor.map(run_local_shard, shards))
+    else:
+        lambda_client = create_worker_lambda_client(len(shards))
+        with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            shard_results = list(executor.map(functools.partial(invoke_worker_lambda, lambda_client), shards))
+
+    summary = {"record_count": 0, "inserted_count": 0, "updated_count": 0, "last_modified_time": None}
+    for shard_result in shard_results:
+        for key in ("record_count", "inserted_count", "updated_count"):
+            summary[key] += shard_result[key]
+        summary["last_modified_time"] = later_modified_time(summary["last_modified_time"], shard_result["last_modified_time"])
+
+    save_log_to_s3({
+        "stage": "Fan-out Extraction",
+        "timestamp": str(datetime.now()),
+        "status": f"Loaded {summary['record_count']} leads from {len(shards)} shards",
+        **summary,
+        "shards": shard_results
+    })
+    return {**summary, "shards": shard_results}
 
 # Main ETL function
 def lambda_handler(event, context):
+    start_run_log(getattr(context, "aws_request_id", None))
+    start_run_timings()
+    profiler = start_profiler(event)
+    etl_skipped = False
     try:
+        # Re-validate an existing backup without touching the Zoho API
+        if event.get("validate_only"):
+            backup_key = event.get("backup_key", s3_key_backup_leads)
+            print(f"Validating backup {backup_key}...")
+            with timed_span("stage.validate"):
+                validate_data(backup_key=backup_key)
+            print("Data validation complete.")
+            return
+
+        # Extract and load one shard of a coordinator run
+        if event.get("mode") == "worker":
+            print(f"Running shard {event['shard']['shard_id']}...")
+            with timed_span("stage.shard"):
+                return run_shard(event["shard"])
+
+        # Reconcile the whole collection against a full backup by bucket checksums
+        if event.get("reconcile"):
+            backup_key = event.get("backup_key", s3_key_backup_leads)
+            print(f"Reconciling MongoDB against backup {backup_key}...")
+            with timed_span("stage.reconcile"):
+                reconcile_data(backup_key=backup_key, num_buckets=event.get("num_buckets", reconcile_num_buckets))
+            print("Reconciliation complete.")
+            return
+
         # Start of ETL
         print("ETL process started.")
         save_log_to_s3_with_stage("ETL Start", "Starting ETL process")
 
         # Check ETL status
         print("Checking ETL status...")
-        etl_status = load_etl_status_from_s3()
+        with timed_span("stage.status_check"):
+            etl_status = load_etl_status_from_s3()
         if not etl_status.get("run_etl", True):
             print("ETL job skipped due to matching record count.")
+            etl_skipped = True
             return
         print("ETL status check complete. Proceeding with ETL job.")
 
-        # Fetch data
-        print("Fetching leads data...")
-        leads = fetch_leads(num_fetch_data)
-        print("Data fetch complete.")
-
-        # Perform incremental load
-        print("Performing incremental load...")
-        incremental_load(leads)
-        print("Incremental load complete.")
-
-        # Validate data
-        print("Validating data...")
-        validate_data()
-        print("Data validation complete.")
+        # Only request leads modified since the last successful load
+        watermark = etl_status.get("last_modified_time")
+        modified_since = watermark if use_watermark and not event.get("full_scan") else None
+        if modified_since:
+            print(f"Fetching leads modified since {modified_since}.")
+
+        # A full scan mostly re-reads leads that are already loaded, index the
+        # collection once so only new and changed leads are written
+        lead_index = None
+        if event.get("full_scan") and event.get("mode") != "coordinator":
+            print("Indexing leads already in MongoDB...")
+            with timed_span("stage.index"):
+                lead_index = get_mongo_lead_index()
+
+        # A full migration passes max_records above bulk_read_threshold to extract with Bulk Read
+        max_records = int(event.get("max_records") or num_fetch_data)
+
+        if event.get("mode") == "coordinator":
+            # Split the page space across workers that extract and load in parallel
+            print("Running fan-out extraction...")
+            with timed_span("stage.fanout"):
+                loaded_modified_time = run_coordinator(event, modified_since)["last_modified_time"]
+            print("Fan-out extraction complete.")
+            leads = None
+        elif event.get("stream", stream_mode):
+            # Stream pages from Zoho straight into the incremental load
+            print("Streaming leads data into incremental load...")
+            with timed_span("stage.stream_load"):
+                loaded_modified_time = incremental_load_batches(stream_leads(max_records, modified_since), lead_index)["last_modified_time"]
+            print("Streaming load complete.")
+
+            # Leads are not kept in memory, validate from this run's S3 backup
+            leads = None
+        else:
+            # Fetch data
+            print("Fetching leads data...")
+            with timed_span("stage.fetch"):
+                leads = fetch_leads(max_records, modified_since)
+            print("Data fetch complete.")
+
+            # Perform incremental load
+            print("Performing incremental load...")
+            with timed_span("stage.load"):
+                loaded_modified_time = incremental_load(leads, lead_index)["last_modified_time"]
+            print("Incremental load complete.")
+        watermark = later_modified_time(watermark, loaded_modified_time)
+
+        # Validate data, shard backups are validated separately with validate_only
+        if event.get("mode") != "coordinator":
+            print("Validating data...")
+            with timed_span("stage.validate"):
+                validate_data(leads)
+            print("Data validation complete.")
 
         # Check and compare record counts
         print("Comparing record counts...")
-        if check_record_count():
+        with timed_span("stage.record_count"):
+            counts_match = check_record_count()
+        if counts_match:
             print("Record counts match. Updating ETL status and stopping ETL job.")
-            update_etl_status_in_s3(run_etl=False)
+            update_etl_status_in_s3(run_etl=False, last_modified_time=watermark)
             save_log_to_s3_with_stage("ETL Stop", "Record counts match. ETL job stopped.", status="COMPLETED")
 
             # Send notification about the completion of the ETL process
@@ -514,7 +1682,7 @@ def lambda_handler(event, context):
             send_notification("ETL project completed successfully. MongoDB record count matches Zoho CRM.")
         else:
             print("Record counts do not match. Updating ETL status to continue ETL job.")
-            update_etl_status_in_s3(run_etl=True)
+            update_etl_status_in_s3(run_etl=True, last_modified_time=watermark)
             save_log_to_s3_with_stage("ETL Continue", "Record counts do not match. ETL job will continue.", status="IN_PROGRESS")
 
         # Final log entry for successful completion
@@ -536,6 +1704,17 @@ def lambda_handler(event, context):
         save_log_to_s3(error_log)
         raise e
 
+    finally:
+        # One S3 write for the whole run log and one batch of metrics, even when the run fails.
+        # The run log is flushed last and regardless, so it keeps the entries of a failed run
+        try:
+            if profiler:
+                save_profile_to_s3(profiler)
+            report_run_timings(send_metrics=not etl_skipped)
+            flush_metrics()
+        finally:
+            flush_run_log()
+
 
 if __name__ == "__main__":
     lambda_handler({}, {})
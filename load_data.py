@@ -1,14 +1,20 @@
 import boto3
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 from botocore.exceptions import ClientError
 import pymongo
+from pymongo.errors import BulkWriteError, OperationFailure
 import json
 import os
-from aws_util import save_log_to_s3
+from aws_util import log_error, save_log_to_s3
+from transform_data import iter_leads
 
 # log_to_cloudwatch("Starting data loading to MongoDB")
 # initialize_cloudwatch_log_group_and_stream()
 
+load_chunk_size = int(os.environ.get("LOAD_CHUNK_SIZE", "1000"))  # Leads per insert_many call
+num_load_workers = int(os.environ.get("LOAD_WORKERS", "4"))
+duplicate_key_error = 11000
 
 
 # Function to get MongoDB credentials from AWS Secrets Manager
@@ -42,8 +48,71 @@ def get_mongo_credentials():
 
     return secret['username'], secret['password'], secret['host'], secret['port']
 
+# Checkpoint of completed chunk offsets, so a re-run resumes where it stopped.
+# The first line identifies the input file and chunk size it belongs to
+def get_checkpoint_source(json_file_path):
+    stat = os.stat(json_file_path)
+    return {"path": json_file_path, "size": stat.st_size, "mtime": stat.st_mtime, "chunk_size": load_chunk_size}
+
+def load_checkpoint(checkpoint_path, source):
+    if not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path, 'r') as file:
+        lines = file.read().splitlines()
+    if not lines or json.loads(lines[0]) != source:
+        print("Checkpoint belongs to another input file, starting over.")
+        return set()
+    return {int(line) for line in lines[1:] if line.strip()}
+
+def open_checkpoint(checkpoint_path, source, completed_offsets):
+    if completed_offsets:
+        return open(checkpoint_path, 'a')
+    checkpoint = open(checkpoint_path, 'w')
+    checkpoint.write(json.dumps(source) + "\n")
+    checkpoint.flush()
+    return checkpoint
+
+def save_checkpoint(checkpoint, offset):
+    checkpoint.write(f"{offset}\n")
+    checkpoint.flush()
+    os.fsync(checkpoint.fileno())
+
+# Split leads into (offset, chunk) pairs of load_chunk_size leads
+def iter_chunks(leads):
+    chunk, offset = [], 0
+    for lead in leads:
+        chunk.append(lead)
+        if len(chunk) == load_chunk_size:
+            yield offset, chunk
+            offset += len(chunk)
+            chunk = []
+    if chunk:
+        yield offset, chunk
+
+# Insert one chunk unordered, so one bad document does not stop the others.
+# Duplicate ids were loaded by an earlier run and count as done
+def insert_chunk(collection, offset, chunk):
+    try:
+        return offset, len(collection.insert_many(chunk, ordered=False).inserted_ids), 0, 0
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        duplicate_count = sum(1 for error in write_errors if error.get("code") == duplicate_key_error)
+        for error in write_errors:
+            if error.get("code") != duplicate_key_error:
+                log_error(error.get("errmsg", "Insert failed"), record=offset + error.get("index", 0))
+        return offset, e.details.get("nInserted", 0), duplicate_count, len(write_errors) - duplicate_count
+
 # Function to connect to MongoDB and load data into 'leads' collection
 def load_data_to_mongodb():
+    """
+    Loads leads_data.json into the 'leads' collection in parallel chunks.
+
+    Chunks of load_chunk_size leads are inserted unordered by
+    num_load_workers threads over one shared connection pool. Each
+    completed chunk offset is recorded in a checkpoint file next to the
+    input, so a re-run after a failure skips the chunks already loaded.
+    The checkpoint is removed once every chunk is in.
+    """
     transformed_data = "transformed_leads"
     leads_data = "leads_data"
     
@@ -56,8 +125,8 @@ def load_data_to_mongodb():
     # MongoDB connection URI
     mongo_uri = f"mongodb://{username}:{password}@{host}:{port}/{database}?tls=true&retryWrites=false&tlsCAFile=/home/ubuntu/etl/zoho-etl-script/etl/global-bundle.pem"
     
-    # Connect to MongoDB
-    client = pymongo.MongoClient(mongo_uri)
+    # Connect to MongoDB, one pooled connection per load worker
+    client = pymongo.MongoClient(mongo_uri, maxPoolSize=num_load_workers)
     db = client[database]
 
     # Check if the 'leads' collection exists, if not, create it
@@ -67,25 +136,67 @@ def load_data_to_mongodb():
         db.create_collection(collection_name)
     else:
         print(f"Collection '{collection_name}' already exists in MongoDB.")
+    collection = db[collection_name]
+
+    # Re-inserted leads fail on the unique id instead of being duplicated
+    try:
+        collection.create_index("id", unique=True)
+    except OperationFailure as e:
+        log_error(f"Failed to create unique index on leads.id: {e}")
 
     # Load transformed data from JSON file
     json_file_path = f'/home/ubuntu/etl/zoho-etl-script/etl/{leads_data}.json'
     if not os.path.exists(json_file_path):
         print(f"File '{json_file_path}' not found. Please ensure data is fetched from Zoho CRM.")
         return
-    
-    with open(json_file_path, 'r') as file:
-        leads_data = json.load(file)
-    
-    # Insert data into the 'leads' collection
-    db[collection_name].insert_many(leads_data)
-    print(f"Inserted {len(leads_data)} documents into the '{collection_name}' collection.")
 
-    inserted_count = len(leads_data)
+    checkpoint_path = f"{json_file_path}.checkpoint"
+    source = get_checkpoint_source(json_file_path)
+    completed_offsets = load_checkpoint(checkpoint_path, source)
+    if completed_offsets:
+        print(f"Resuming load, {len(completed_offsets)} chunks already loaded.")
+
+    inserted_count, duplicate_count, failed_count, skipped_count = 0, 0, 0, 0
+    with open(json_file_path, 'r') as file, \
+            open_checkpoint(checkpoint_path, source, completed_offsets) as checkpoint, \
+            ThreadPoolExecutor(max_workers=num_load_workers) as executor:
+        pending = set()
+
+        def collect(futures):
+            nonlocal inserted_count, duplicate_count, failed_count
+            for future in futures:
+                offset, inserted, duplicates, failed = future.result()
+                inserted_count += inserted
+                duplicate_count += duplicates
+                failed_count += failed
+                if not failed:
+                    save_checkpoint(checkpoint, offset)
+
+        for offset, chunk in iter_chunks(iter_leads(file)):
+            if offset in completed_offsets:
+                skipped_count += len(chunk)
+                continue
+
+            # Keep at most two chunks per worker in memory
+            if len(pending) >= 2 * num_load_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(executor.submit(insert_chunk, collection, offset, chunk))
+        collect(pending)
+
+    # Every chunk is in, the next load starts from scratch
+    if not failed_count:
+        os.remove(checkpoint_path)
+    print(f"Inserted {inserted_count} documents into the '{collection_name}' collection "
+          f"({duplicate_count} already loaded, {skipped_count} skipped by checkpoint, {failed_count} failed).")
+
     log_entry = {
         "stage": "Loading",
         "timestamp": str(datetime.now()),
         "record_count": inserted_count,
+        "duplicate_count": duplicate_count,
+        "skipped_count": skipped_count,
+        "failed_count": failed_count,
         "status": "Data loaded into MongoDB"
     }
     save_log_to_s3(log_entry)
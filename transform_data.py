@@ -1,49 +1,142 @@
 import json
+import os
+import re
+from collections import Counter
 from aws_util import log_error, send_metrics_to_cloudwatch, log_to_cloudwatch, save_log_to_s3
 from datetime import datetime
 
 
 # log_to_cloudwatch("Starting data transformation from Zoho CRM")
 
+input_path = "/home/ubuntu/etl/zoho-etl-script/etl/leads_data.json"
+output_path = "/home/ubuntu/etl/zoho-etl-script/etl/transformed_leads.json"
+read_chunk_size = 1024 * 1024  # Characters read from the input file at a time
+required_fields = ["Email", "Lead_Status", "Phone"]
+separator_pattern = re.compile(r"[\s,]*")
+
 # Transform function with validation for required fields
-def transform_lead_data(lead):
+# Missing fields are counted in missing_fields when a Counter is passed,
+# otherwise a warning is printed for each of them
+def transform_lead_data(lead, missing_fields=None):
     transformed = {k: v for k, v in lead.items() if v}
-    required_fields = ["Email", "Lead_Status", "Phone"]
 
     for field in required_fields:
         if field not in transformed:
             transformed[field] = None  # Default value if missing
-            print(f"Warning: Field '{field}' missing in record. Added as None.")
+            if missing_fields is None:
+                print(f"Warning: Field '{field}' missing in record. Added as None.")
+            else:
+                missing_fields[field] += 1
 
     return transformed
 
-def transform_data():
+# Yield the elements of a JSON array one at a time, reading the file in chunks
+def iter_json_array(file):
+    decoder = json.JSONDecoder()
+    buffer = file.read(read_chunk_size).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array of leads")
+    position, eof = 1, False
+
+    while True:
+        position = separator_pattern.match(buffer, position).end()
+        if position < len(buffer) and buffer[position] == "]":
+            return
+
+        # Decode the next element, reading more when it runs past the buffer
+        try:
+            element, end = decoder.raw_decode(buffer, position)
+            complete = end < len(buffer) or eof
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            complete = False
+        if complete:
+            yield element
+            position = end
+            continue
+
+        chunk = file.read(read_chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+# Yield leads from a JSON array or an NDJSON file
+def iter_leads(file):
+    first_char = " "
+    while first_char and first_char.isspace():
+        first_char = file.read(1)
+    file.seek(0)
+
+    if first_char == "[":
+        yield from iter_json_array(file)
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+def transform_data(input_path=input_path, output_path=output_path):
+    """
+    Transforms leads one record at a time, so memory use does not grow with
+    the size of the input.
+
+    The input is a JSON array or NDJSON. The output is written as it goes,
+    as NDJSON when output_path ends with ".ndjson" and as a JSON array
+    otherwise, and replaces output_path only once the transform completes.
+    Missing required fields are counted per field instead of printed for
+    every record.
+    """
+    missing_fields = Counter()
+    record_count, failed_count = 0, 0
+    output_ndjson = output_path.endswith(".ndjson")
+    temp_path = f"{output_path}.tmp"
+
     try:
-        with open("/home/ubuntu/etl/zoho-etl-script/etl/leads_data.json", "r") as file:
-            leads_data = json.load(file)
+        with open(input_path, "r", buffering=read_chunk_size) as source, \
+                open(temp_path, "w", buffering=read_chunk_size) as target:
+            if not output_ndjson:
+                target.write("[")
+
+            for index, lead in enumerate(iter_leads(source)):
+                try:
+                    transformed = transform_lead_data(lead, missing_fields)
+                except Exception as e:
+                    # send_metrics_to_cloudwatch("FailedRecords", 1)
+                    failed_count += 1
+                    log_error(str(e), record=index)  # Log with index as identifier
+                    continue
 
-        transformed_leads = []
-        
-        for index, lead in enumerate(leads_data):
-            try:
-                transformed = transform_lead_data(lead)
-                transformed_leads.append(transformed)
+                # Save transformed data for loading
+                if output_ndjson:
+                    target.write(json.dumps(transformed) + "\n")
+                else:
+                    target.write(("," if record_count else "") + "\n" + json.dumps(transformed))
+                record_count += 1
 
-                # send_metrics_to_cloudwatch("RecordsProcessed", 1)  # Send metric on success
-            except Exception as e:
-                # send_metrics_to_cloudwatch("FailedRecords", 1)
-                log_error(str(e), record=index)  # Log with index as identifier
+            if not output_ndjson:
+                target.write("\n]\n")
+        os.replace(temp_path, output_path)
 
-        # Save transformed data for loading
-        with open("/home/ubuntu/etl/zoho-etl-script/etl/transformed_leads.json", "w") as file:
-            json.dump(transformed_leads, file)
+        for field, count in missing_fields.items():
+            print(f"Warning: Field '{field}' missing in {count} records. Added as None.")
+        print(f"Data transformation complete. {record_count} transformed leads saved to {output_path}.")
 
-        print("Data transformation complete. Transformed data saved to transformed_leads.json.")
+        log_entry = {
+            "stage": "Transformation",
+            "timestamp": str(datetime.now()),
+            "record_count": record_count,
+            "failed_count": failed_count,
+            "missing_fields": dict(missing_fields),
+            "status": "Data transformed"
+        }
+        save_log_to_s3(log_entry)
 
     except Exception as e:
         # Catch errors that might occur in the outer function scope
         # send_metrics_to_cloudwatch("FailedRecords", 1)
         log_error(str(e), record="general")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
 
 if __name__ == "__main__":
     transform_data()
@@ -0,0 +1,75 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Repository root, the ETL modules are imported from there
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Module -> code that initializes what a first invocation needs from it
+modules = {
+    "aws_util": "module.get_s3_client()",
+    "extract_data": "module.get_secrets_client()",
+    "transform_data": "",
+    "load_data": "",
+    "validate_data": "",
+    "lambda_function": "module.get_s3_client()",
+}
+
+# Runs in a fresh interpreter so every measurement is a real cold import
+probe_code = """
+import importlib, json, sys, time
+start = time.perf_counter()
+module = importlib.import_module({module!r})
+imported = time.perf_counter()
+{init}
+initialized = time.perf_counter()
+heavy = [name for name in ("requests", "pymongo") if name in sys.modules]
+print(json.dumps({{"import": imported - start, "init": initialized - imported, "heavy": heavy}}))
+"""
+
+def measure(module, init, repeat):
+    env = {**os.environ, "AWS_DEFAULT_REGION": os.environ.get("AWS_DEFAULT_REGION", "ap-southeast-2")}
+    samples = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", probe_code.format(module=module, init=init or "pass")],
+            cwd=repo_dir, env=env, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            return {"error": result.stderr.strip().splitlines()[-1]}
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return {
+        "import_ms": statistics.median(sample["import"] for sample in samples) * 1000,
+        "init_ms": statistics.median(sample["init"] for sample in samples) * 1000,
+        "heavy": samples[-1]["heavy"],
+    }
+
+# Measure import and first-use init time of each ETL module
+def run_benchmark(repeat=5, selected=None):
+    results = {}
+    for module, init in modules.items():
+        if selected and module not in selected:
+            continue
+        results[module] = measure(module, init, repeat)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold import and init time of the ETL modules.")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module, the median is reported")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    parser.add_argument("modules", nargs="*", help="Modules to measure, all of them by default")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.repeat, args.modules)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'module':<18}{'import ms':>12}{'init ms':>12}  heavy imports loaded")
+        for module, result in results.items():
+            if "error" in result:
+                print(f"{module:<18}  failed: {result['error']}")
+                continue
+            print(f"{module:<18}{result['import_ms']:>12.1f}{result['init_ms']:>12.1f}  {', '.join(result['heavy']) or '-'}")
@@ -0,0 +1,159 @@
+import argparse
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# Make the ETL modules importable when run as utils/bench_pipeline.py
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import lambda_function
+from fake_services import (
+    FakeCloudWatchClient, FakeS3Client, FakeSecretsClient, FakeZohoServer, generate_leads, get_mongo_client
+)
+
+# Point lambda_function at the local stand-ins, also run in every local fan-out
+# worker so shards never reach AWS or the DocumentDB CA bundle
+def wire_services(zoho_url, mongo_uri=None, num_workers=None):
+    fakes = {
+        "s3": FakeS3Client(),
+        "secrets": FakeSecretsClient(),
+        "cloudwatch": FakeCloudWatchClient(),
+        "mongo": get_mongo_client(mongo_uri),
+    }
+    lambda_function.get_s3_client = lambda: fakes["s3"]
+    lambda_function.get_secrets_client = lambda: fakes["secrets"]
+    lambda_function.get_cloudwatch_client = lambda: fakes["cloudwatch"]
+    lambda_function.send_notification = lambda message: print(f"Notification (not sent): {message}")
+    lambda_function.mongo_client = fakes["mongo"]
+    lambda_function.leads_collection_ready = False
+    lambda_function.zoho_base_url = f"{zoho_url}/crm/v2/Leads"
+    lambda_function.zoho_count_url = f"{zoho_url}/crm/v2.1/Leads/actions/count"
+    lambda_function.zoho_token_url = f"{zoho_url}/oauth/v2/token"
+    lambda_function.zoho_bulk_read_url = f"{zoho_url}/crm/bulk/v2/read"
+    lambda_function.bulk_read_poll_interval = 0.05
+    lambda_function.zoho_token_cache.update(access_token=None, expires_at=0)
+
+    # The session pool and the rate limiter burst are sized from the worker count
+    if num_workers:
+        lambda_function.num_fetch_workers = num_workers
+    lambda_function.zoho_rate_limiter = lambda_function.ZohoRateLimiter(
+        lambda_function.zoho_rate_limit, max(1, lambda_function.num_fetch_workers)
+    )
+    lambda_function.get_zoho_session.cache_clear()
+    return fakes
+
+def wire_pipeline(zoho_server, mongo_uri=None, num_workers=None):
+    fakes = wire_services(zoho_server.base_url, mongo_uri, num_workers)
+    lambda_function.local_worker_initializer = functools.partial(
+        wire_services, zoho_server.base_url, mongo_uri, num_workers
+    )
+    fakes["mongo"][lambda_function.mongo_database].drop_collection("leads")
+    return fakes
+
+# Run one stage and measure its wall time and throughput, or with trace_memory
+# its peak traced memory only, as tracing slows allocation-heavy stages severalfold
+def measure_stage(name, record_count, function, *args, trace_memory=False, **kwargs):
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    stage = {"stage": name, "records": record_count}
+    if trace_memory:
+        stage["peak_memory_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+        tracemalloc.stop()
+    else:
+        stage["seconds"] = round(elapsed, 4)
+        stage["records_per_sec"] = round(record_count / elapsed, 1) if elapsed else None
+    return result, stage
+
+# Time every stage in one run, then measure peak memory in a second traced run
+def run_benchmark(num_leads, mongo_uri=None, num_workers=None):
+    report = run_stages(num_leads, mongo_uri, num_workers)
+    traced_report = run_stages(num_leads, mongo_uri, num_workers, trace_memory=True)
+    peak_memory = {stage["stage"]: stage["peak_memory_mb"] for stage in traced_report["stages"]}
+    for stage in report["stages"]:
+        stage["peak_memory_mb"] = peak_memory.get(stage["stage"])
+    return report
+
+def run_stages(num_leads, mongo_uri=None, num_workers=None, trace_memory=False):
+    measure = functools.partial(measure_stage, trace_memory=trace_memory)
+    zoho_server = FakeZohoServer(generate_leads(num_leads)).start()
+    try:
+        fakes = wire_pipeline(zoho_server, mongo_uri, num_workers)
+        results = []
+
+        _, result = measure("fetch_leads_bulk", num_leads, lambda_function.fetch_leads, num_leads, backend="bulk")
+        results.append(result)
+
+        # Backend left to choose_extract_backend, with the threshold just under the dataset
+        bulk_read_threshold = lambda_function.bulk_read_threshold
+        lambda_function.bulk_read_threshold = max(1, num_leads - 1)
+        try:
+            backend = lambda_function.choose_extract_backend(num_leads)
+            _, result = measure(f"fetch_leads_auto:{backend}", num_leads, lambda_function.fetch_leads, num_leads)
+            results.append(result)
+        finally:
+            lambda_function.bulk_read_threshold = bulk_read_threshold
+        leads, result = measure("fetch_leads", num_leads, lambda_function.fetch_leads, num_leads, backend="rest")
+        results.append(result)
+        _, result = measure("incremental_load", len(leads), lambda_function.incremental_load, leads)
+        results.append(result)
+        _, result = measure("validate_data", len(leads), lambda_function.validate_data, leads)
+        results.append(result)
+        _, result = measure("check_record_count", num_leads, lambda_function.check_record_count)
+        results.append(result)
+        _, result = measure("reconcile_data", len(leads), lambda_function.reconcile_data, leads)
+        results.append(result)
+        del leads
+
+        # Fan-out across local worker processes, each wired to the stand-ins
+        fanout_event = {"dispatch": "local", "max_records": num_leads}
+        _, result = measure("fanout_local", num_leads, lambda_function.run_coordinator, fanout_event)
+        results.append(result)
+
+        # Full handler run against a fresh collection and ETL status
+        fakes = wire_pipeline(zoho_server, mongo_uri, num_workers)
+        _, result = measure("lambda_handler", num_leads, lambda_function.lambda_handler, {"full_scan": True, "max_records": num_leads}, None)
+        results.append(result)
+        lambda_function.flush_run_log()
+
+        return {
+            "num_leads": num_leads,
+            "stages": results,
+            "zoho_requests": zoho_server.request_count,
+            "s3_requests": fakes["s3"].request_count,
+            "cloudwatch_requests": fakes["cloudwatch"].request_count,
+        }
+    finally:
+        zoho_server.stop()
+
+def print_report(report):
+    print(f"\n{report['num_leads']} leads  (Zoho requests: {report['zoho_requests']}, "
+          f"S3 requests in handler run: {report['s3_requests']}, CloudWatch requests: {report['cloudwatch_requests']})")
+    print(f"{'stage':<24}{'seconds':>10}{'records/sec':>14}{'peak MB':>10}")
+    for stage in report["stages"]:
+        print(f"{stage['stage']:<24}{stage['seconds']:>10.3f}{stage['records_per_sec'] or 0:>14.1f}{stage['peak_memory_mb']:>10.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the ETL end to end against local Zoho, S3 and MongoDB stand-ins.")
+    parser.add_argument("--sizes", default="1000,10000", help="Comma-separated dataset sizes")
+    parser.add_argument("--workers", type=int, default=None, help="Zoho fetch workers, NUM_FETCH_WORKERS by default")
+    parser.add_argument("--mongo-uri", default=os.environ.get("BENCH_MONGO_URI"), help="Real MongoDB to use instead of the in-memory stand-in")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    reports = []
+    for size in (int(size) for size in args.sizes.split(",")):
+        report = run_benchmark(size, args.mongo_uri, args.workers)
+        print_report(report)
+        reports.append(report)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(reports, file, indent=2)
@@ -0,0 +1,443 @@
+import csv
+import io
+import json
+import operator
+import random
+import threading
+import zipfile
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-ins for Zoho CRM, S3, Secrets Manager and CloudWatch, used by the
+# offline benchmarks so the pipeline can run without any real service
+
+industries = ["Healthcare", "Education", "Finance", "Marketing", "Engineering", "Legal"]
+first_names = ["Olivia", "Jack", "Charlotte", "Noah", "Amelia", "William", "Isla", "Oliver", "Mia", "Leo"]
+last_names = ["Smith", "Jones", "Williams", "Brown", "Wilson", "Taylor", "Johnson", "White", "Martin", "Anderson"]
+zoho_tz = timezone(timedelta(hours=10))
+
+# Generate sample leads with the same fields as utils/lead_gen.py, plus the
+# id and Modified_Time that Zoho adds
+def generate_leads(num_leads, seed=42):
+    rng = random.Random(seed)
+    try:
+        from faker import Faker
+        fake = Faker()
+        Faker.seed(seed)
+    except ImportError:
+        fake = None
+
+    start_time = datetime(2024, 1, 1, tzinfo=zoho_tz)
+    leads = []
+    for index in range(num_leads):
+        first_name = fake.first_name() if fake else rng.choice(first_names)
+        last_name = fake.last_name() if fake else rng.choice(last_names)
+        leads.append({
+            "id": str(5_000_000_000_000_000 + index),
+            "First_Name": first_name,
+            "Last_Name": last_name,
+            "Email": f"{first_name.lower()}.{last_name.lower()}.{index}@example.com",
+            "Phone": fake.phone_number() if fake else f"04{rng.randint(10000000, 99999999)}",
+            "Company": fake.company() if fake else f"{last_name} Pty Ltd",
+            "Industry": rng.choice(industries),
+            "Lead_Status": "New",
+            "Modified_Time": (start_time + timedelta(seconds=index)).isoformat()
+        })
+    return leads
+
+class FakeZohoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body=None, headers=None):
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_zip(self, name, content):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.writestr(name, content)
+        payload = archive.getvalue()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.server.request_count += 1
+        if url.path == "/oauth/v2/token":
+            self.send_json(200, {"access_token": "fake-access-token", "expires_in": 3600})
+        elif url.path == "/crm/bulk/v2/read":
+            job_id = self.server.create_bulk_read_job(json.loads(body)["query"])
+            self.send_json(201, {"data": [{
+                "status": "success",
+                "code": "ADDED_SUCCESSFULLY",
+                "message": "Added successfully.",
+                "details": {"id": job_id, "operation": "read", "state": "ADDED"}
+            }], "info": {}})
+        else:
+            self.send_json(404, {"code": "INVALID_URL_PATTERN"})
+
+    # Bulk Read job status and result download
+    def do_bulk_read_GET(self, path):
+        job_id, _, resource = path[len("/crm/bulk/v2/read/"):].partition("/")
+        job = self.server.bulk_read_jobs.get(job_id)
+        if job is None:
+            self.send_json(404, {"code": "RESOURCE_NOT_FOUND"})
+            return
+
+        page_size = self.server.bulk_read_page_size
+        page_leads = self.server.leads[(job["page"] - 1) * page_size:job["page"] * page_size]
+        if resource == "result":
+            # Zoho names the record id column "Id" and leaves empty fields blank
+            fields = [field for field in job["fields"] if field != "id"]
+            content = io.StringIO()
+            writer = csv.writer(content)
+            writer.writerow(["Id"] + fields)
+            for lead in page_leads:
+                writer.writerow([lead["id"]] + [lead.get(field) or "" for field in fields])
+            self.send_zip(f"{job_id}.csv", content.getvalue())
+            return
+
+        # Each poll moves the job along, it completes after bulk_read_polls polls
+        job["polls"] += 1
+        details = {"id": job_id, "operation": "read", "state": "IN PROGRESS", "query": job["query"]}
+        if job["polls"] >= self.server.bulk_read_polls:
+            details["state"] = "COMPLETED"
+            details["result"] = {
+                "page": job["page"],
+                "count": len(page_leads),
+                "download_url": f"/crm/bulk/v2/read/{job_id}/result",
+                "per_page": page_size,
+                "more_records": job["page"] * page_size < len(self.server.leads)
+            }
+        self.send_json(200, {"data": [details]})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.server.request_count += 1
+        if url.path.startswith("/crm/bulk/v2/read/"):
+            self.do_bulk_read_GET(url.path)
+            return
+        leads = self.server.get_leads(self.headers.get("If-Modified-Since"))
+
+        if url.path.endswith("/Leads/actions/count"):
+            self.send_json(200, {"count": len(leads)})
+        elif url.path.endswith("/Leads"):
+            page, per_page = int(params.get("page", 1)), int(params.get("per_page", 200))
+            page_leads = leads[(page - 1) * per_page:page * per_page]
+            if not page_leads:
+                self.send_json(304 if self.headers.get("If-Modified-Since") and not leads else 204)
+                return
+            fields = set(params.get("fields", "").split(",")) | {"id"}
+            data = [{key: value for key, value in lead.items() if key in fields} for lead in page_leads]
+            more_records = page * per_page < len(leads)
+            self.send_json(200, {"data": data, "info": {"page": page, "per_page": per_page, "count": len(data), "more_records": more_records}})
+        else:
+            self.send_json(404, {"code": "INVALID_URL_PATTERN"})
+
+class FakeZohoServer(ThreadingHTTPServer):
+    """
+    Serves paginated Zoho Leads, the count endpoint, token refresh and Bulk
+    Read jobs on localhost.
+
+    Bulk Read jobs complete after `bulk_read_polls` status polls, and each
+    job exports one page of `bulk_read_page_size` leads as a zipped CSV.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, leads, port=0, bulk_read_page_size=200000, bulk_read_polls=2):
+        super().__init__(("127.0.0.1", port), FakeZohoHandler)
+        self.leads = leads
+        self.request_count = 0
+        self.bulk_read_jobs = {}
+        self.bulk_read_page_size = bulk_read_page_size
+        self.bulk_read_polls = bulk_read_polls
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    def create_bulk_read_job(self, query):
+        with self.lock:
+            job_id = str(4_000_000_000_000_000 + len(self.bulk_read_jobs) + 1)
+            self.bulk_read_jobs[job_id] = {
+                "query": query,
+                "page": int(query.get("page", 1)),
+                "fields": query.get("fields", []),
+                "polls": 0
+            }
+        return job_id
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def get_leads(self, modified_since=None):
+        if not modified_since:
+            return self.leads
+        since = datetime.fromisoformat(modified_since)
+        return [lead for lead in self.leads if datetime.fromisoformat(lead["Modified_Time"]) > since]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class FakeS3Client:
+    """In-memory S3 client covering the calls the ETL makes."""
+
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.request_count = 0
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.request_count += 1
+        self.objects[(Bucket, Key)] = Body.encode("utf-8") if isinstance(Body, str) else bytes(Body)
+        return {}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self.request_count += 1
+        if (Bucket, Key) not in self.objects:
+            raise self.exceptions.NoSuchKey(Key)
+        body = self.objects[(Bucket, Key)]
+        return {"Body": io.BytesIO(body), "ContentLength": len(body)}
+
+    def upload_file(self, Filename, Bucket, Key, **kwargs):
+        with open(Filename, "rb") as file:
+            self.put_object(Bucket, Key, file.read())
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self.request_count += 1
+        upload_id = f"upload-{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self.request_count += 1
+        self.uploads[UploadId][PartNumber] = bytes(Body)
+        return {"ETag": f'"{UploadId}-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self.request_count += 1
+        parts = self.uploads.pop(UploadId)
+        self.objects[(Bucket, Key)] = b"".join(parts[part["PartNumber"]] for part in MultipartUpload["Parts"])
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self.request_count += 1
+        self.uploads.pop(UploadId, None)
+        return {}
+
+class FakeSecretsClient:
+    """Returns fixed Zoho and MongoDB secrets."""
+
+    def __init__(self, secrets=None):
+        self.secrets = secrets or {
+            "zoho_crm_credentials": {"ZOHO_REFRESH_TOKEN": "refresh", "ZOHO_CLIENT_ID": "client", "ZOHO_SECRET": "secret"},
+            "zohocrmmig": {"username": "bench", "password": "bench", "host": "localhost", "port": 27017},
+        }
+
+    def get_secret_value(self, SecretId):
+        return {"SecretString": json.dumps(self.secrets[SecretId])}
+
+class FakeCloudWatchClient:
+    """Counts PutMetricData calls instead of sending them."""
+
+    def __init__(self):
+        self.request_count = 0
+        self.metric_count = 0
+
+    def put_metric_data(self, Namespace, MetricData):
+        self.request_count += 1
+        self.metric_count += len(MetricData)
+        return {}
+
+# In-memory MongoDB stand-in covering the queries the ETL makes, with the
+# documents indexed by Zoho id so upserts and id lookups stay O(1)
+def get_field(document, expression):
+    if isinstance(expression, str) and expression.startswith("$"):
+        return document.get(expression[1:])
+    if isinstance(expression, dict) and "$mod" in expression:
+        value, divisor = (get_field(document, operand) for operand in expression["$mod"])
+        return value % divisor if value is not None else None
+    return expression
+
+comparisons = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+
+def matches(document, query):
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(matches(document, sub_query) for sub_query in condition):
+                return False
+            continue
+        value = document.get(field)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+            continue
+        for op, operand in condition.items():
+            if op == "$in" and value not in operand:
+                return False
+            if op == "$exists" and (field in document) != operand:
+                return False
+            if op == "$eq" and value != operand:
+                return False
+            if op in comparisons and (value is None or not comparisons[op](value, operand)):
+                return False
+    return True
+
+def project(document, projection):
+    if not projection:
+        return dict(document)
+    included = [field for field, flag in projection.items() if flag and field != "_id"]
+    if included:
+        result = {field: document[field] for field in included if field in document}
+    else:
+        result = {field: value for field, value in document.items() if projection.get(field, 1)}
+    if projection.get("_id", 1) and "_id" in document:
+        result["_id"] = document["_id"]
+    return result
+
+class FakeCursor(list):
+    def batch_size(self, size):
+        return self
+
+class FakeBulkWriteResult:
+    def __init__(self, inserted_count=0, upserted_count=0, modified_count=0):
+        self.inserted_count = inserted_count
+        self.upserted_count = upserted_count
+        self.modified_count = modified_count
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = {}
+        self.next_id = 0
+        self.lock = threading.Lock()
+
+    def _store(self, document):
+        self.next_id += 1
+        document.setdefault("_id", self.next_id)
+        self.documents[document.get("id", f"_{document['_id']}")] = document
+
+    def _candidates(self, query):
+        # Fast path for the id lookups the ETL makes
+        condition = query.get("id")
+        if isinstance(condition, dict) and set(condition) == {"$in"}:
+            return [self.documents[key] for key in condition["$in"] if key in self.documents]
+        if condition is not None and not isinstance(condition, dict):
+            return [self.documents[condition]] if condition in self.documents else []
+        return list(self.documents.values())
+
+    def create_index(self, keys, **kwargs):
+        return f"{keys}_1"
+
+    def index_information(self):
+        return {"_id_": {}, "id_1": {"unique": True}}
+
+    def insert_many(self, documents, ordered=True):
+        with self.lock:
+            for document in documents:
+                self._store(document)
+        return FakeBulkWriteResult(inserted_count=len(documents))
+
+    def bulk_write(self, operations, ordered=True):
+        upserted_count, modified_count = 0, 0
+        with self.lock:
+            for operation in operations:
+                lead_filter, update = operation._filter, operation._doc
+                existing = self._candidates(lead_filter)
+                if existing:
+                    document = existing[0]
+                    changes = {key: value for key, value in update["$set"].items() if document.get(key) != value}
+                    if changes:
+                        document.update(changes)
+                        modified_count += 1
+                elif operation._upsert:
+                    self._store({**lead_filter, **update["$set"]})
+                    upserted_count += 1
+        return FakeBulkWriteResult(upserted_count=upserted_count, modified_count=modified_count)
+
+    def find(self, query=None, projection=None, **kwargs):
+        query = query or {}
+        with self.lock:
+            return FakeCursor(project(document, projection) for document in self._candidates(query) if matches(document, query))
+
+    def find_one(self, query=None, projection=None):
+        results = self.find(query, projection)
+        return results[0] if results else None
+
+    def count_documents(self, query):
+        return len(self.find(query, {"_id": 1}))
+
+    def estimated_document_count(self):
+        return len(self.documents)
+
+    def aggregate(self, pipeline):
+        with self.lock:
+            documents = [dict(document) for document in self.documents.values()]
+        for stage in pipeline:
+            if "$match" in stage:
+                documents = [document for document in documents if matches(document, stage["$match"])]
+            elif "$project" in stage:
+                documents = [
+                    {field: get_field(document, f"${field}" if value in (1, True) else value)
+                     for field, value in stage["$project"].items() if value not in (0, False)}
+                    for document in documents
+                ]
+            elif "$group" in stage:
+                groups = {}
+                for document in documents:
+                    key = get_field(document, stage["$group"]["_id"])
+                    group = groups.setdefault(key, {"_id": key})
+                    for field, accumulator in stage["$group"].items():
+                        if field != "_id":
+                            group[field] = group.get(field, 0) + get_field(document, accumulator["$sum"])
+                documents = list(groups.values())
+        return FakeCursor(documents)
+
+class FakeDatabase(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection()
+        return self[name]
+
+    def list_collection_names(self):
+        return list(self)
+
+    def create_collection(self, name):
+        return self[name]
+
+    def drop_collection(self, name):
+        self.pop(name, None)
+
+class FakeMongoClient(dict):
+    def __missing__(self, name):
+        self[name] = FakeDatabase()
+        return self[name]
+
+# MongoDB stand-in: a real server when a URI is given, in memory otherwise
+def get_mongo_client(mongo_uri=None):
+    if mongo_uri:
+        import pymongo
+        return pymongo.MongoClient(mongo_uri)
+    return FakeMongoClient()
@@ -4,10 +4,13 @@ from botocore.exceptions import ClientError
 from pymongo import MongoClient
 from datetime import datetime
 from extract_data import fetch_leads
+from lambda_function import find_mongo_leads_by_id, iter_lead_chunks, lookup_chunk_size
 from aws_util import save_log_to_s3
 
 # log_to_cloudwatch("Starting data validation from Zoho CRM")
 
+required_fields = ["Email", "Lead_Status", "Phone"]  # Required fields for validation
+
 # Function to get MongoDB credentials from AWS Secrets Manager
 def get_mongo_credentials():
     secret_name = "zohocrmmig"
@@ -55,36 +58,32 @@ def get_leads_collection():
         
     return db[collection_name]
 
-# Fetch lead data from MongoDB
-def get_mongo_leads():
-    leads_collection = get_leads_collection()
-    leads = list(leads_collection.find({}, {"_id": 0}))
-    return {lead["Email"]: lead for lead in leads}
-
 # Compare Zoho data with MongoDB
 def validate_data():
-    mongo_leads = get_mongo_leads()
+    leads_collection = get_leads_collection()
     zoho_leads = fetch_leads(max_records=200)  # Re-fetch from Zoho to ensure freshness
 
     discrepancies = []
-    required_fields = ["Email", "Lead_Status", "Phone"]  # Required fields for validation
 
-    for zoho_lead in zoho_leads:
-        email = zoho_lead.get("Email")
-        mongo_lead = mongo_leads.get(email)
-        
-        if not mongo_lead:
-            discrepancies.append({"Email": email, "error": "Missing in MongoDB"})
-            continue
-
-        for field in required_fields:
-            if mongo_lead.get(field) != zoho_lead.get(field):
-                discrepancies.append({
-                    "Email": email,
-                    "field": field,
-                    "zoho_value": zoho_lead.get(field),
-                    "mongo_value": mongo_lead.get(field)
-                })
+    # Read back only the fetched leads, in chunked $in lookups on the unique id index
+    for zoho_chunk in iter_lead_chunks(zoho_leads, lookup_chunk_size):
+        lead_ids = [zoho_lead["id"] for zoho_lead in zoho_chunk if zoho_lead.get("id")]
+        mongo_leads = find_mongo_leads_by_id(leads_collection, lead_ids, required_fields)
+
+        for zoho_lead in zoho_chunk:
+            mongo_lead = mongo_leads.get(zoho_lead.get("id"))
+            if mongo_lead is None:
+                discrepancies.append({"id": zoho_lead.get("id"), "Email": zoho_lead.get("Email"), "error": "Missing in MongoDB"})
+                continue
+            for field in required_fields:
+                if mongo_lead.get(field) != zoho_lead.get(field):
+                    discrepancies.append({
+                        "id": zoho_lead["id"],
+                        "Email": zoho_lead.get("Email"),
+                        "field": field,
+                        "zoho_value": zoho_lead.get(field),
+                        "mongo_value": mongo_lead.get(field)
+                    })
 
     # Log discrepancies
     if discrepancies: